@@ -1,6 +1,8 @@
 """
 Vercel serverless function entry point for Django
 """
+import functools
+import logging
 import os
 import sys
 from pathlib import Path
@@ -13,106 +15,252 @@ sys.path.insert(0, str(BASE_DIR))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'novyra_ai.settings')
 os.environ.setdefault('VERCEL', '1')
 
-# Import Django
-import django
-django.setup()
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_app():
+    """
+    Set up Django and import the WSGI application once per process
+    """
+    import django
+    django.setup()
+    
+    from novyra_ai.wsgi import application
+    return application
 
-# Import WSGI application
-from novyra_ai.wsgi import application
 
 # Vercel handler
 from vercel import Request, Response
 
+
+class _FileWrapper:
+    """
+    PEP 3333 wsgi.file_wrapper: iterate a file in blocks without reading it all
+    """
+
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+        self.block_size = block_size
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+
+    def __iter__(self):
+        read = self.filelike.read
+        block_size = self.block_size
+        while True:
+            data = read(block_size)
+            if not data:
+                break
+            yield data
+
+
+# Static WSGI environ keys, copied into each request's environ
+_BASE_ENVIRON = {
+    'SERVER_PROTOCOL': 'HTTP/1.1',
+    'wsgi.version': (1, 0),
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+    'wsgi.file_wrapper': _FileWrapper,
+}
+
+# Header name -> environ key mapping ("x-forwarded-for" -> "X_FORWARDED_FOR")
+_HEADER_KEY_TABLE = str.maketrans(
+    'abcdefghijklmnopqrstuvwxyz-',
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ_',
+)
+_SKIP_HEADERS = frozenset({'CONTENT_TYPE', 'CONTENT_LENGTH'})
+_HTTPS = 'https'
+_HTTP = 'http'
+
+class _MemoryViewInput:
+    """
+    Read-only file-like wsgi.input backed by a memoryview (no copy of the body)
+    """
+
+    def __init__(self, body):
+        self._view = memoryview(body).cast('B')
+        self._pos = 0
+        # Searchable buffer for readline(); only copied if body has no find()
+        source = body.obj if isinstance(body, memoryview) else body
+        if not isinstance(source, (bytes, bytearray)) or len(source) != len(self._view):
+            source = None
+        self._source = source
+
+    def _end(self, size):
+        remaining = len(self._view) - self._pos
+        if size is None or size < 0 or size > remaining:
+            return self._pos + remaining
+        return self._pos + size
+
+    def read(self, size=-1):
+        end = self._end(size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+    def readline(self, size=-1):
+        limit = self._end(size)
+        if self._source is None:
+            self._source = self._view.tobytes()
+        newline = self._source.find(b'\n', self._pos, limit)
+        end = limit if newline == -1 else newline + 1
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+    def readlines(self, hint=-1):
+        lines = []
+        total = 0
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            lines.append(line)
+            total += len(line)
+            if 0 < hint <= total:
+                break
+        return lines
+
+    def readinto(self, buffer):
+        target = memoryview(buffer).cast('B')
+        end = self._end(len(target))
+        count = end - self._pos
+        target[:count] = self._view[self._pos:end]
+        self._pos = end
+        return count
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+def _join_body(response_body):
+    """
+    Join a re-iterable, non-streaming WSGI response body into a single bytes object
+    """
+    try:
+        try:
+            return b''.join(response_body)
+        except TypeError:
+            # Non-bytes chunks: fall back to encoding each one
+            return b''.join(
+                part if isinstance(part, bytes) else str(part).encode('utf-8')
+                for part in response_body
+            )
+    finally:
+        close = getattr(response_body, 'close', None)
+        if close is not None:
+            close()
+
+
+def _iter_body(response_body):
+    """
+    Yield each WSGI response chunk as bytes, closing the iterable when done (PEP 3333)
+    """
+    try:
+        for part in response_body:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield str(part).encode('utf-8')
+    finally:
+        close = getattr(response_body, 'close', None)
+        if close is not None:
+            close()
+
 def handler(request: Request):
     """
     Vercel serverless function handler for Django
     """
-    from io import BytesIO
-    
     # Get request body
-    body = b''
-    if hasattr(request, 'body'):
-        if isinstance(request.body, bytes):
-            body = request.body
-        elif isinstance(request.body, str):
-            body = request.body.encode('utf-8')
+    # Bytes-like bodies are passed through as-is, no re-encode or copy
+    body = getattr(request, 'body', None) or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    elif not isinstance(body, (bytes, bytearray, memoryview)):
+        body = b''
     
     # Get query string
-    query_string = ''
-    if hasattr(request, 'query_string'):
-        if isinstance(request.query_string, bytes):
-            query_string = request.query_string.decode('utf-8')
-        else:
-            query_string = str(request.query_string or '')
+    query_string = getattr(request, 'query_string', None) or ''
+    if isinstance(query_string, bytes):
+        query_string = query_string.decode('utf-8')
+    elif not isinstance(query_string, str):
+        query_string = str(query_string)
     
     # Get path
-    path = request.path if hasattr(request, 'path') else '/'
+    path = getattr(request, 'path', '/')
     
     # Get host
     host = request.headers.get('host', 'localhost')
-    server_name = host.split(':')[0] if ':' in host else host
-    server_port = host.split(':')[1] if ':' in host else '80'
+    server_name, sep, server_port = host.rpartition(':')
+    if not sep or not server_port.isdigit():
+        # No port given (or a bare IPv6 literal such as "[::1]")
+        server_name, server_port = host, '80'
+    
+    # Reuse the inbound Content-Length when the client sent one
+    content_length = request.headers.get('content-length')
+    if content_length is None:
+        content_length = str(memoryview(body).nbytes)
     
-    # Build WSGI environ
-    environ = {
+    # Build WSGI environ from the static template
+    environ = _BASE_ENVIRON.copy()
+    environ.update({
         'REQUEST_METHOD': request.method,
         'PATH_INFO': path,
         'QUERY_STRING': query_string,
         'CONTENT_TYPE': request.headers.get('content-type', ''),
-        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_LENGTH': content_length,
         'SERVER_NAME': server_name,
         'SERVER_PORT': server_port,
-        'SERVER_PROTOCOL': 'HTTP/1.1',
-        'wsgi.version': (1, 0),
-        'wsgi.url_scheme': 'https' if request.headers.get('x-forwarded-proto') == 'https' else 'http',
-        'wsgi.input': BytesIO(body),
-        'wsgi.errors': sys.stderr,
-        'wsgi.multithread': False,
-        'wsgi.multiprocess': True,
-        'wsgi.run_once': False,
-    }
+        'wsgi.url_scheme': _HTTPS if request.headers.get('x-forwarded-proto') == _HTTPS else _HTTP,
+        'wsgi.input': _MemoryViewInput(body),
+    })
     
     # Add HTTP headers
-    for key, value in request.headers.items():
-        key_upper = key.upper().replace('-', '_')
-        if key_upper not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
-            environ[f'HTTP_{key_upper}'] = value
+    translated = ((key.translate(_HEADER_KEY_TABLE), value) for key, value in request.headers.items())
+    environ.update(
+        ('HTTP_' + key_upper, value)
+        for key_upper, value in translated
+        if key_upper not in _SKIP_HEADERS
+    )
     
     # Response data
-    response_data = {'status': 200, 'headers': [], 'body': b''}
+    status_code = 200
+    response_headers = []
     
     def start_response(status, headers):
-        response_data['status'] = int(status.split()[0])
-        response_data['headers'] = headers
+        nonlocal status_code, response_headers
+        status_code = int(status.split()[0])
+        response_headers = headers
     
     # Call WSGI application
     try:
-        response_body = application(environ, start_response)
+        response_body = _get_app()(environ, start_response)
         
-        # Collect response body
-        body_parts = []
-        for part in response_body:
-            if isinstance(part, bytes):
-                body_parts.append(part)
-            else:
-                body_parts.append(str(part).encode('utf-8'))
-        response_data['body'] = b''.join(body_parts)
-    except Exception as e:
-        import traceback
-        error_msg = f"Error: {str(e)}\n{traceback.format_exc()}"
-        response_data['status'] = 500
-        response_data['headers'] = [('Content-Type', 'text/plain')]
-        response_data['body'] = error_msg.encode('utf-8')
-    
-    # Convert headers to dict
-    headers_dict = {}
-    for key, value in response_data['headers']:
-        headers_dict[key] = value
+        if getattr(response_body, 'streaming', True):
+            # Stream response body chunk by chunk instead of buffering it
+            body = _iter_body(response_body)
+        else:
+            # Regular HttpResponse: content is already in memory, join it in C
+            body = _join_body(response_body)
+    except Exception:
+        logger.exception("WSGI handler error")
+        status_code = 500
+        response_headers = [('Content-Type', 'text/plain')]
+        body = b'Internal Server Error'
     
     return Response(
-        response_data['body'],
-        status=response_data['status'],
-        headers=headers_dict
+        body,
+        status=status_code,
+        headers=dict(response_headers)
     )
 
 # Export for Vercel
@@ -1,6 +1,5 @@
 # build_files.py
 import os
-import subprocess
 import sys
 
 # Make sure Django is importable
@@ -13,5 +12,7 @@ os.environ['DJANGO_ALLOW_ASYNC_UNSAFE'] = 'true'
 import django
 django.setup()
 
-# Run collectstatic
-subprocess.run([sys.executable, "manage.py", "collectstatic", "--noinput", "--clear"])
+from django.core.management import call_command
+
+# Run collectstatic in-process (Django is already set up)
+call_command("collectstatic", interactive=False, clear=True)
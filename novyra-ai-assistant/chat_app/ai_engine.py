@@ -1,11 +1,216 @@
 """AI Core Engine - NLP and Intent Recognition with ML Learning"""
 import re
+import copy
 import json
-from typing import Dict, List, Tuple, Optional
+import functools
+import logging
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Tuple, Optional
 from django.conf import settings
-from .models import KnowledgeBase, ConversationLearning, WebsiteContent, ChatSession, Message
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BooleanField, Count, F, Func, Value
+from .models import KnowledgeBase, ConversationLearning, WebsiteContent, Message
 from .deepseek_client import DeepSeekClient
 
+try:
+    import ahocorasick
+except ImportError:  # Optional - falls back to plain substring scans
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_COUNTS_CACHE_KEY = 'ai_engine:success_counts'
+SUCCESS_COUNTS_CACHE_TTL = 60  # seconds
+KNOWLEDGE_VERSION_CACHE_KEY = 'ai_engine:knowledge_version'
+# Without a shared CACHES backend the version lives in each process's LocMemCache, so an edit
+# handled by one worker only reaches the others when their token expires
+KNOWLEDGE_VERSION_CACHE_TTL = 60  # seconds
+
+RESPONSE_CACHE_SIZE = 512
+
+# Rule-based intents answered before any DB access - their response depends only on the
+# normalized message and the session's last intent
+CACHEABLE_INTENTS = frozenset({'package_selection', 'greeting', 'appreciation', 'goodbye', 'pricing', 'business_hours'})
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+# Common stop words filtered out of extracted keywords
+_STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are', 'was', 'were'})
+
+
+class _PunctTable(dict):
+    """str.translate table mapping punctuation (anything but word/space chars) to a space, filled lazily per character"""
+    
+    def __missing__(self, char: int) -> int:
+        value = 32 if _PUNCT_RE.match(chr(char)) else char
+        self[char] = value
+        return value
+
+
+_PUNCT_TABLE = _PunctTable()
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_text(text: str) -> str:
+    return ' '.join(text.lower().translate(_PUNCT_TABLE).split())
+
+
+@functools.lru_cache(maxsize=4096)
+def _extract_keywords(text: str) -> Tuple[str, ...]:
+    normalized = _normalize_text(text)
+    # Simple keyword extraction (can be enhanced with NLTK)
+    words = normalized.split()
+    # Filter out common stop words
+    return tuple(w for w in words if w not in _STOP_WORDS and len(w) > 2)
+
+
+@functools.lru_cache(maxsize=4096)
+def _keyword_set(text: str) -> FrozenSet[str]:
+    return frozenset(_extract_keywords(text))
+
+
+def _jaccard(keywords1: FrozenSet[str], keywords2: FrozenSet[str]) -> float:
+    if not keywords1 or not keywords2:
+        return 0.0
+    intersection = len(keywords1 & keywords2)
+    return intersection / (len(keywords1) + len(keywords2) - intersection)
+
+
+def _jaccard_from_overlap(intersection: int, size1: int, size2: int) -> float:
+    """Jaccard similarity from a precomputed intersection size"""
+    if not intersection:
+        return 0.0
+    return intersection / (size1 + size2 - intersection)
+
+
+class KBRow(NamedTuple):
+    """Active KnowledgeBase entry with its match data preprocessed"""
+    id: int
+    title: str
+    content: str
+    content_keywords: FrozenSet[str]
+    intent: Optional[str]
+    intent_lower: Optional[str]
+    category: str
+    keywords: Tuple[str, ...]
+
+
+class WebsiteRow(NamedTuple):
+    """Active WebsiteContent page with its match data preprocessed"""
+    url: str
+    title: Optional[str]
+    preview: str
+    content_keywords: FrozenSet[str]
+    title_keywords: FrozenSet[str]
+
+
+class WebsiteIndex(NamedTuple):
+    """Website rows plus inverted indexes: keyword -> positions of rows whose content / title contains it"""
+    rows: List[WebsiteRow]
+    content_rows: Dict[str, Tuple[int, ...]]
+    title_rows: Dict[str, Tuple[int, ...]]
+
+
+# Process-local row caches: name -> (knowledge version, rows)
+_knowledge_cache: Dict[str, Tuple[str, list]] = {}
+
+
+def knowledge_version() -> str:
+    """Token that changes whenever KnowledgeBase/WebsiteContent rows change, and at least every KNOWLEDGE_VERSION_CACHE_TTL"""
+    return cache.get_or_set(KNOWLEDGE_VERSION_CACHE_KEY, lambda: uuid.uuid4().hex, KNOWLEDGE_VERSION_CACHE_TTL)
+
+
+def _cached_rows(name: str, loader):
+    version = knowledge_version()
+    cached = _knowledge_cache.get(name)
+    if cached is None or cached[0] != version:
+        cached = (version, loader())
+        _knowledge_cache[name] = cached
+    return cached[1]
+
+
+def invalidate_knowledge_cache() -> None:
+    """Drop cached KnowledgeBase/WebsiteContent rows and rule-based responses in this process (other processes within KNOWLEDGE_VERSION_CACHE_TTL, or immediately with a shared cache)"""
+    cache.set(KNOWLEDGE_VERSION_CACHE_KEY, uuid.uuid4().hex, KNOWLEDGE_VERSION_CACHE_TTL)
+    with _response_cache_lock:
+        _response_cache.clear()
+
+
+# Process-local LRU of rule-based responses: (knowledge version, normalized message, last intent) -> response.
+# The version in the key retires answers built from KnowledgeBase rows or learned patterns when it rotates.
+_response_cache: 'OrderedDict[Tuple[str, str, Optional[str]], Dict]' = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+
+def _get_cached_response(key: Tuple[str, str, Optional[str]]) -> Optional[Dict]:
+    with _response_cache_lock:
+        response = _response_cache.get(key)
+        if response is None:
+            return None
+        _response_cache.move_to_end(key)
+    return copy.deepcopy(response)  # Callers may modify the result, including kb_entry
+
+
+def _cache_response(key: Tuple[str, str, Optional[str]], response: Dict) -> None:
+    response = copy.deepcopy(response)
+    with _response_cache_lock:
+        _response_cache[key] = response
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+def _load_kb_rows() -> List[KBRow]:
+    return [
+        KBRow(
+            id=entry.id,
+            title=entry.title,
+            content=entry.content,
+            content_keywords=_keyword_set(entry.content),
+            intent=entry.intent,
+            intent_lower=entry.intent.lower() if entry.intent else None,
+            category=entry.category,
+            keywords=tuple(k.strip().lower() for k in entry.keywords.split(',')),
+        )
+        for entry in KnowledgeBase.objects.filter(is_active=True).order_by('-priority').only(
+            'id', 'title', 'content', 'intent', 'category', 'keywords'
+        ).iterator(chunk_size=200)
+    ]
+
+
+def _load_website_rows() -> List[WebsiteRow]:
+    return [
+        WebsiteRow(
+            url=content.url,
+            title=content.title,
+            preview=content.content[:500] + '...' if len(content.content) > 500 else content.content,
+            content_keywords=frozenset(_extract_keywords(content.content)),
+            title_keywords=_keyword_set(_normalize_text(content.title)) if content.title else frozenset(),
+        )
+        for content in WebsiteContent.objects.filter(is_active=True).only(
+            'url', 'title', 'content'
+        ).iterator(chunk_size=200)
+    ]
+
+
+def _load_website_index() -> WebsiteIndex:
+    rows = _load_website_rows()
+    content_rows: Dict[str, List[int]] = {}
+    title_rows: Dict[str, List[int]] = {}
+    for position, row in enumerate(rows):
+        for kw in row.content_keywords:
+            content_rows.setdefault(kw, []).append(position)
+        for kw in row.title_keywords:
+            title_rows.setdefault(kw, []).append(position)
+    return WebsiteIndex(
+        rows,
+        {kw: tuple(positions) for kw, positions in content_rows.items()},
+        {kw: tuple(positions) for kw, positions in title_rows.items()},
+    )
+
 
 class AIEngine:
     """Core AI engine for intent recognition and response generation"""
@@ -13,6 +218,9 @@ class AIEngine:
     def __init__(self):
         self.confidence_threshold = getattr(settings, 'AI_CONFIDENCE_THRESHOLD', 0.7)
         self.escalation_keywords = getattr(settings, 'AI_ESCALATION_KEYWORDS', [])
+        # Single words are matched by token-set intersection, multi-word phrases by substring
+        self._escalation_word_set = frozenset(kw.lower() for kw in self.escalation_keywords if ' ' not in kw)
+        self._escalation_phrases = tuple(kw.lower() for kw in self.escalation_keywords if ' ' in kw)
         self.deepseek_client = DeepSeekClient()  # Initialize DeepSeek client
         
         # Abusive language patterns (common profanity and offensive terms)
@@ -23,6 +231,7 @@ class AIEngine:
             r'\b(you\s*suck|you\s*are\s*stupid|you\s*are\s*dumb)\b',
             # Add more patterns as needed
         ]
+        self._abusive_re = re.compile('|'.join(f'(?:{p})' for p in self.abusive_patterns), re.IGNORECASE)
         
         # Novyra Marketing Services Information
         self.novyra_services = {
@@ -137,71 +346,148 @@ Which package interests you? I can provide more details or help you get started!
 
 We're here to help you during business hours. If you contact us outside these hours, our agents will reach out to you via email as soon as we're open. Feel free to leave your message anytime, and we'll get back to you!""",
         }
+        
+        # Casual conversation patterns
+        self.greeting_patterns = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'greetings']
+        self.appreciation_patterns = ['thank', 'thanks', 'appreciate', 'grateful', 'helpful']
+        self.goodbye_patterns = ['bye', 'goodbye', 'see you', 'farewell', 'later', 'gotta go', 'have to go', 'talk later']
+        
+        # Dispatch table: casual intent -> one precompiled whole-word alternation of its patterns
+        self._conversation_res = {
+            intent: re.compile(r'\b(?:' + '|'.join(re.escape(p) for p in patterns) + r')\b')
+            for intent, patterns in (
+                ('greeting', self.greeting_patterns),
+                ('appreciation', self.appreciation_patterns),
+                ('goodbye', self.goodbye_patterns),
+            )
+        }
+        
+        # Keyword buckets scanned by detect_intent, matched in one pass via Aho-Corasick if available
+        self.keyword_buckets = {
+            'pricing': self.pricing_info['keywords'],
+            'business_hours': self.business_hours_info['keywords'],
+        }
+        for service_key, service_data in self.novyra_services.items():
+            self.keyword_buckets[f'service_{service_key}'] = service_data['keywords']
+        
+        # Inverted index: keyword -> buckets it belongs to
+        keyword_to_buckets = {}
+        for bucket, keywords in self.keyword_buckets.items():
+            for kw in keywords:
+                keyword_to_buckets.setdefault(kw, []).append(bucket)
+        self._keyword_index = {kw: tuple(buckets) for kw, buckets in keyword_to_buckets.items()}
+        self._keyword_automaton = self._build_keyword_automaton()
+    
+    def _build_keyword_automaton(self):
+        """Build an Aho-Corasick automaton over every bucket keyword"""
+        if ahocorasick is None:
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for kw in self._keyword_index:
+            automaton.add_word(kw, kw)
+        automaton.make_automaton()
+        return automaton
+    
+    def count_keyword_matches(self, normalized_msg: str) -> Dict[str, int]:
+        """Count distinct keywords of each bucket found in the message"""
+        counts = dict.fromkeys(self.keyword_buckets, 0)
+        
+        if self._keyword_automaton is None:
+            # Each distinct keyword is scanned once, however many buckets share it
+            found = [buckets for kw, buckets in self._keyword_index.items() if kw in normalized_msg]
+        else:
+            matched = {kw for _, kw in self._keyword_automaton.iter(normalized_msg)}
+            found = [self._keyword_index[kw] for kw in matched]
+        
+        for buckets in found:
+            for bucket in buckets:
+                counts[bucket] += 1
+        return counts
     
     def normalize_text(self, text: str) -> str:
-        """Normalize input text for matching"""
-        text = text.lower().strip()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        return text
+        """Normalize input text for matching (memoized)"""
+        return _normalize_text(text)
     
     def extract_keywords(self, text: str) -> List[str]:
-        """Extract keywords from text"""
-        normalized = self.normalize_text(text)
-        # Simple keyword extraction (can be enhanced with NLTK)
-        words = normalized.split()
-        # Filter out common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are', 'was', 'were'}
-        keywords = [w for w in words if w not in stop_words and len(w) > 2]
-        return keywords
+        """Extract keywords from text (memoized)"""
+        return list(_extract_keywords(text))
     
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """Calculate simple keyword-based similarity (0.0 to 1.0)"""
-        keywords1 = set(self.extract_keywords(text1))
-        keywords2 = set(self.extract_keywords(text2))
-        
-        if not keywords1 or not keywords2:
-            return 0.0
-        
-        intersection = keywords1.intersection(keywords2)
-        union = keywords1.union(keywords2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        return _jaccard(_keyword_set(text1), _keyword_set(text2))
     
     def learn_from_past_conversations(self, message: str) -> Optional[Dict]:
         """Learn from past successful conversations"""
-        normalized_msg = self.normalize_text(message)
+        if connection.vendor == 'postgresql':
+            return self._learn_from_past_conversations_trigram(message)
+        
+        # Keyword set of the incoming message, computed once for all rows
+        message_keywords = _keyword_set(message)
         
         # Find similar past conversations that were helpful
         past_conversations = ConversationLearning.objects.filter(
             was_helpful=True,
             escalated=False
-        ).order_by('-confidence', '-created_at')[:50]
+        ).order_by('-confidence', '-created_at').values_list(
+            'user_message', 'ai_response', 'intent_detected', 'confidence'
+        )[:50]
         
         best_match = None
         best_similarity = 0.0
         
-        for past in past_conversations:
-            similarity = self.calculate_similarity(normalized_msg, self.normalize_text(past.user_message))
+        for user_message, ai_response, intent_detected, past_confidence in past_conversations:
+            similarity = _jaccard(message_keywords, _keyword_set(user_message))
             if similarity > best_similarity and similarity > 0.6:
                 best_similarity = similarity
                 best_match = {
-                    'response': past.ai_response,
-                    'intent': past.intent_detected,
-                    'confidence': past.confidence * similarity  # Weight by similarity
+                    'response': ai_response,
+                    'intent': intent_detected,
+                    'confidence': past_confidence * similarity  # Weight by similarity
                 }
         
         return best_match
     
-    def detect_intent(self, message: str, session_context: Optional[Dict] = None) -> Tuple[Optional[str], float, Optional[Dict]]:
-        """
-        Detect intent from user message with ML learning and context awareness
-        Enhanced with modern AI patterns (Grok, Gemini, Selar-style intelligence)
-        Returns: (intent, confidence, kb_entry)
-        """
-        normalized_msg = self.normalize_text(message)
+    def _learn_from_past_conversations_trigram(self, message: str) -> Optional[Dict]:
+        """Rank past conversations by pg_trgm similarity in the database (PostgreSQL only)"""
+        from django.contrib.postgres.search import TrigramSimilarity
         
-        # Context-aware intent detection (like modern AI assistants)
+        past = ConversationLearning.objects.filter(
+            # "%" operator - lets PostgreSQL use the trigram GIN index
+            Func(F('user_message'), Value(message), arg_joiner=' %% ', template='%(expressions)s', output_field=BooleanField()),
+            was_helpful=True,
+            escalated=False,
+        ).annotate(
+            similarity=TrigramSimilarity('user_message', message)
+        ).filter(
+            similarity__gt=0.6
+        ).order_by('-similarity', '-confidence', '-created_at').values(
+            'ai_response', 'intent_detected', 'confidence', 'similarity'
+        ).first()
+        
+        if not past:
+            return None
+        return {
+            'response': past['ai_response'],
+            'intent': past['intent_detected'],
+            'confidence': past['confidence'] * past['similarity']  # Weight by similarity
+        }
+    
+    def _get_success_counts(self) -> Dict[str, int]:
+        """Helpful-conversation counts per detected intent, cached briefly"""
+        return cache.get_or_set(
+            SUCCESS_COUNTS_CACHE_KEY,
+            lambda: dict(
+                ConversationLearning.objects.filter(was_helpful=True)
+                .values('intent_detected')
+                .annotate(count=Count('id'))
+                .values_list('intent_detected', 'count')
+            ),
+            SUCCESS_COUNTS_CACHE_TTL,
+        )
+    
+    def _check_context_followup(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Context-aware intent detection (like modern AI assistants)"""
         # Check for follow-up questions based on context
         if session_context:
             last_intent = session_context.get('last_intent')
@@ -212,64 +498,59 @@ We're here to help you during business hours. If you contact us outside these ho
                     'title': 'Package Selection',
                     'packages': self.pricing_info.get('packages', []),
                 })
-        
-        # First, check learned patterns
-        learned_response = self.learn_from_past_conversations(message)
-        if learned_response and learned_response['confidence'] > 0.7:
-            return (learned_response['intent'], learned_response['confidence'], {
-                'content': learned_response['response'],
-                'title': 'Learned Response',
-            })
-        
-        # Enhanced pattern matching - like Grok/Gemini style understanding
-        # Check for greetings and casual conversation
-        greeting_patterns = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'greetings']
-        if any(pattern in normalized_msg for pattern in greeting_patterns) and len(normalized_msg.split()) < 5:
+        return None
+    
+    def _check_greeting(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Greetings and casual conversation - like Grok/Gemini style understanding"""
+        if self._conversation_res['greeting'].search(normalized_msg) and len(normalized_msg.split()) < 5:
             return ('greeting', 0.95, {
                 'content': "Hello! 👋 I'm here to help you with Novyra Marketing services. What can I assist you with today?",
                 'title': 'Greeting',
             })
-        
-        # Check for thank you / appreciation
-        appreciation_patterns = ['thank', 'thanks', 'appreciate', 'grateful', 'helpful']
-        if any(pattern in normalized_msg for pattern in appreciation_patterns):
+        return None
+    
+    def _check_appreciation(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Thank you / appreciation"""
+        if self._conversation_res['appreciation'].search(normalized_msg):
             return ('appreciation', 0.9, {
                 'content': "You're very welcome! 😊 I'm glad I could help. Is there anything else you'd like to know about our services?",
                 'title': 'Appreciation',
             })
-        
-        # Enhanced understanding - like Grok/Gemini
-        # Check for goodbye/farewell
-        goodbye_patterns = ['bye', 'goodbye', 'see you', 'farewell', 'later', 'gotta go', 'have to go', 'talk later']
-        if any(pattern in normalized_msg for pattern in goodbye_patterns):
+        return None
+    
+    def _check_goodbye(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Goodbye/farewell"""
+        if self._conversation_res['goodbye'].search(normalized_msg):
             return ('goodbye', 0.95, {
                 'content': "Goodbye! 👋 It was great helping you today. Feel free to come back anytime if you have more questions. Have a wonderful day!",
                 'title': 'Goodbye',
             })
-        
-        # Check for pricing queries
-        pricing_keywords = self.pricing_info['keywords']
-        pricing_matches = sum(1 for kw in pricing_keywords if kw in normalized_msg)
-        if pricing_matches > 0:
+        return None
+    
+    def _check_pricing(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Pricing queries"""
+        if keyword_counts['pricing'] > 0:
             return ('pricing', 0.9, {
                 'content': self.pricing_info['content'],
                 'title': 'Pricing Information',
                 'packages': self.pricing_info.get('packages', []),
             })
-        
-        # Check for business hours queries
-        hours_keywords = self.business_hours_info['keywords']
-        hours_matches = sum(1 for kw in hours_keywords if kw in normalized_msg)
-        if hours_matches > 0:
+        return None
+    
+    def _check_business_hours(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Business hours queries"""
+        if keyword_counts['business_hours'] > 0:
             return ('business_hours', 0.9, {
                 'content': self.business_hours_info['content'],
                 'title': 'Business Hours',
             })
-        
-        # Check for service queries
+        return None
+    
+    def _check_services(self, normalized_msg: str, keyword_counts: Dict[str, int], session_context: Optional[Dict]) -> Optional[Tuple[str, float, Dict]]:
+        """Service queries"""
         for service_key, service_data in self.novyra_services.items():
             service_keywords = service_data['keywords']
-            service_matches = sum(1 for kw in service_keywords if kw in normalized_msg)
+            service_matches = keyword_counts[f'service_{service_key}']
             if service_matches > 0:
                 confidence = min(service_matches / max(len(service_keywords), 1), 1.0)
                 if confidence >= 0.5:  # Lower threshold for services
@@ -277,20 +558,52 @@ We're here to help you during business hours. If you contact us outside these ho
                         'content': service_data['content'],
                         'title': service_key.replace('_', ' ').title(),
                     })
+        return None
+    
+    def detect_intent(self, message: str, session_context: Optional[Dict] = None, _normalized: Optional[str] = None) -> Tuple[Optional[str], float, Optional[Dict]]:
+        """
+        Detect intent from user message with ML learning and context awareness
+        Enhanced with modern AI patterns (Grok, Gemini, Selar-style intelligence)
+        Returns: (intent, confidence, kb_entry)
+        """
+        normalized_msg = _normalized if _normalized is not None else self.normalize_text(message)
+        keyword_counts = self.count_keyword_matches(normalized_msg)
+        
+        # Cheap rule-based checks first (no DB access), returning on the first confident hit
+        for check in (self._check_context_followup, self._check_greeting, self._check_appreciation,
+                      self._check_goodbye, self._check_pricing, self._check_business_hours):
+            result = check(normalized_msg, keyword_counts, session_context)
+            if result and result[1] >= 0.9:
+                return result
+        
+        # Then check learned patterns
+        learned_response = self.learn_from_past_conversations(message)
+        if learned_response and learned_response['confidence'] > 0.7:
+            return (learned_response['intent'], learned_response['confidence'], {
+                'content': learned_response['response'],
+                'title': 'Learned Response',
+            })
         
-        # Check for escalation keywords
-        if any(keyword in normalized_msg for keyword in self.escalation_keywords):
+        # Check for service queries
+        result = self._check_services(normalized_msg, keyword_counts, session_context)
+        if result:
+            return result
+        
+        # Check for escalation keywords (whole words, as in should_escalate)
+        if self.has_escalation_keyword(normalized_msg):
             return ('escalation', 0.9, None)
         
         # Search knowledge base
-        kb_entries = KnowledgeBase.objects.filter(is_active=True).order_by('-priority')
+        kb_entries = _cached_rows('knowledge_base', _load_kb_rows)
         best_match = None
         best_confidence = 0.0
         best_intent = None
+        success_counts = None  # Loaded on first keyword match
+        message_keywords = _keyword_set(normalized_msg)  # Tokenized once for every entry
         
         for entry in kb_entries:
             # Match against keywords
-            entry_keywords = [k.strip().lower() for k in entry.keywords.split(',')]
+            entry_keywords = entry.keywords
             keyword_matches = sum(1 for kw in entry_keywords if kw in normalized_msg)
             
             if keyword_matches > 0:
@@ -298,18 +611,17 @@ We're here to help you during business hours. If you contact us outside these ho
                 confidence = min(keyword_matches / max(len(entry_keywords), 1), 1.0)
                 
                 # Boost confidence if intent matches
-                if entry.intent and entry.intent.lower() in normalized_msg:
+                if entry.intent_lower and entry.intent_lower in normalized_msg:
                     confidence = min(confidence + 0.2, 1.0)
                 
                 # Also check content similarity
-                content_sim = self.calculate_similarity(normalized_msg, entry.content.lower())
+                content_sim = _jaccard(message_keywords, entry.content_keywords)
                 confidence = max(confidence, content_sim * 0.8)
                 
                 # Boost confidence if this pattern was successful before
-                successful_patterns = ConversationLearning.objects.filter(
-                    intent_detected=entry.intent or entry.category,
-                    was_helpful=True
-                ).count()
+                if success_counts is None:
+                    success_counts = self._get_success_counts()
+                successful_patterns = success_counts.get(entry.intent or entry.category, 0)
                 if successful_patterns > 0:
                     confidence = min(confidence + 0.1, 1.0)
                 
@@ -331,52 +643,58 @@ We're here to help you during business hours. If you contact us outside these ho
             'title': 'General Response',
         })
     
+    def has_escalation_keyword(self, normalized: str) -> bool:
+        """Check normalized text for an escalation keyword or phrase"""
+        if not self._escalation_word_set.isdisjoint(normalized.split()):
+            return True
+        return any(phrase in normalized for phrase in self._escalation_phrases)
+    
     def detect_abusive_language(self, message: str) -> bool:
         """Detect if message contains abusive language"""
         normalized = self.normalize_text(message)
-        for pattern in self.abusive_patterns:
-            if re.search(pattern, normalized, re.IGNORECASE):
-                return True
-        return False
+        return self._abusive_re.search(normalized) is not None
     
     def search_website_content(self, query: str) -> Optional[Dict]:
         """Search website content for relevant information"""
         try:
             normalized_query = self.normalize_text(query)
-            query_keywords = set(self.extract_keywords(query))
+            query_keywords = _keyword_set(query)
+            title_query_keywords = _keyword_set(normalized_query)
             
-            # Search active website content
-            website_contents = WebsiteContent.objects.filter(is_active=True)
+            # Count shared keywords per page in one pass over the posting lists;
+            # only pages sharing a keyword with the query can score above zero
+            website_index = _cached_rows('website_content', _load_website_index)
+            content_overlap = Counter()
+            for kw in query_keywords:
+                content_overlap.update(website_index.content_rows.get(kw, ()))
+            title_overlap = Counter()
+            for kw in title_query_keywords:
+                title_overlap.update(website_index.title_rows.get(kw, ()))
             best_match = None
             best_score = 0.0
             
-            for content in website_contents:
-                # Calculate similarity with content
-                content_normalized = self.normalize_text(content.content)
-                content_keywords = set(self.extract_keywords(content.content))
-                
-                # Keyword overlap
-                keyword_overlap = len(query_keywords.intersection(content_keywords))
-                total_keywords = len(query_keywords.union(content_keywords))
-                score = keyword_overlap / total_keywords if total_keywords > 0 else 0.0
+            for position in sorted(content_overlap.keys() | title_overlap.keys()):
+                content = website_index.rows[position]
+                # Keyword overlap with content
+                score = _jaccard_from_overlap(content_overlap[position], len(query_keywords), len(content.content_keywords))
                 
                 # Also check title similarity
                 if content.title:
-                    title_sim = self.calculate_similarity(normalized_query, self.normalize_text(content.title))
+                    title_sim = _jaccard_from_overlap(title_overlap[position], len(title_query_keywords), len(content.title_keywords))
                     score = max(score, title_sim * 0.8)
                 
                 if score > best_score and score > 0.3:  # Minimum threshold
                     best_score = score
                     best_match = {
-                        'content': content.content[:500] + '...' if len(content.content) > 500 else content.content,
+                        'content': content.preview,
                         'title': content.title or 'Website Information',
                         'url': content.url,
                         'confidence': min(best_score, 0.9)  # Cap at 0.9 for website content
                     }
             
             return best_match
-        except Exception as e:
-            print(f"Error searching website content: {e}")
+        except Exception:
+            logger.exception("Error searching website content")
             return None
     
     def _get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
@@ -385,26 +703,28 @@ We're here to help you during business hours. If you contact us outside these ho
             if not session_id:
                 return []
             
-            session = ChatSession.objects.filter(session_id=session_id).first()
-            if not session:
-                return []
-            
-            messages = Message.objects.filter(session=session).order_by('-created_at')[:limit]
-            history = []
-            
-            for msg in reversed(messages):  # Reverse to get chronological order
-                history.append({
-                    'type': msg.message_type,
-                    'content': msg.content,
-                    'created_at': msg.created_at.isoformat() if msg.created_at else None
-                })
+            # One joined query, read as plain tuples instead of model instances
+            messages = list(
+                Message.objects.filter(session__session_id=session_id)
+                .order_by('-created_at')
+                .values_list('message_type', 'content', 'created_at')[:limit]
+            )
+            messages.reverse()  # Reverse to get chronological order
             
-            return history
-        except Exception as e:
-            print(f"Error getting conversation history: {e}")
+            return [
+                {
+                    'type': message_type,
+                    'content': content,
+                    'created_at': created_at.isoformat() if created_at else None
+                }
+                for message_type, content, created_at in messages
+            ]
+        except Exception:
+            logger.exception("Error getting conversation history")
             return []
     
-    def generate_response(self, message: str, session_id: str = None, is_business_hours: bool = True, session_context: Optional[Dict] = None) -> Dict:
+    def generate_response(self, message: str, session_id: str = None, is_business_hours: bool = True, session_context: Optional[Dict] = None,
+                          on_delta: Optional[Callable[[str], None]] = None) -> Dict:
         """
         Generate AI response for user message using DeepSeek AI (primary) with fallback
         Returns: {
@@ -440,7 +760,8 @@ We're here to help you during business hours. If you contact us outside these ho
                     user_message=message,
                     conversation_history=conversation_history,
                     context=enhanced_context,
-                    is_business_hours=is_business_hours
+                    is_business_hours=is_business_hours,
+                    on_delta=on_delta
                 )
                 
                 # If DeepSeek returned a valid response, use it
@@ -454,14 +775,21 @@ We're here to help you during business hours. If you contact us outside these ho
                         'kb_entry': None,  # DeepSeek handles this internally
                     }
                 else:
-                    print(f"⚠️ DeepSeek API returned error, falling back to rule-based: {deepseek_result.get('error')}")
+                    logger.warning("DeepSeek API returned error, falling back to rule-based: %s", deepseek_result.get('error'))
             except Exception as e:
-                print(f"⚠️ DeepSeek API error, falling back to rule-based: {e}")
-                import traceback
-                traceback.print_exc()
+                # Only pay for the traceback when debug logging is on
+                logger.warning("DeepSeek API error, falling back to rule-based: %s", e,
+                               exc_info=logger.isEnabledFor(logging.DEBUG))
         
         # FALLBACK: Use rule-based intent detection (original logic)
-        intent, confidence, kb_entry = self.detect_intent(message, session_context)
+        normalized = self.normalize_text(message)
+        response_cache_key = (knowledge_version(), normalized, session_context.get('last_intent') if session_context else None)
+        cached_response = _get_cached_response(response_cache_key)
+        if cached_response is not None:
+            return cached_response
+        
+        has_escalation_keyword = self.has_escalation_keyword(normalized)
+        intent, confidence, kb_entry = self.detect_intent(message, session_context, _normalized=normalized)
         
         # If no good match found, try searching website content
         if not kb_entry or confidence < self.confidence_threshold:
@@ -475,12 +803,12 @@ We're here to help you during business hours. If you contact us outside these ho
         escalation_needed = (
             confidence < self.confidence_threshold or
             intent == 'escalation' or
-            any(keyword in self.normalize_text(message) for keyword in self.escalation_keywords)
+            has_escalation_keyword
         )
         
         # If we can't understand the question (low confidence or no good match), offer to connect to agent
         # Check if it's an explicit escalation request first
-        if intent == 'escalation' or any(keyword in self.normalize_text(message) for keyword in self.escalation_keywords):
+        if intent == 'escalation' or has_escalation_keyword:
             response_text = "I understand you'd like to speak with an agent. Let me connect you to one of our team members who can provide you with more clarity and assistance."
         elif confidence < self.confidence_threshold:
             # Low confidence - AI doesn't understand the question
@@ -495,19 +823,36 @@ We're here to help you during business hours. If you contact us outside these ho
             # Fallback (shouldn't normally reach here, but just in case)
             response_text = "Thank you for your question! I'd be happy to help you with that. Could you provide a bit more detail so I can give you the most accurate and helpful response?"
         
-        return {
+        result = {
             'response': response_text,
             'confidence': confidence,
             'intent': intent,
             'escalation_needed': escalation_needed,
             'kb_entry': kb_entry,
         }
+        # Confident rule-based answers skip the website search, so they are safe to reuse
+        if intent in CACHEABLE_INTENTS and confidence >= self.confidence_threshold:
+            _cache_response(response_cache_key, result)
+        return result
     
     def should_escalate(self, message: str, confidence: float) -> bool:
         """Determine if chat should be escalated to human agent"""
         normalized = self.normalize_text(message)
-        has_escalation_keyword = any(kw in normalized for kw in self.escalation_keywords)
+        has_escalation_keyword = self.has_escalation_keyword(normalized)
         low_confidence = confidence < self.confidence_threshold
         
         return has_escalation_keyword or low_confidence
 
+
+_engine: Optional[AIEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AIEngine:
+    """Process-wide AIEngine, built on first use (per-message state is passed as arguments)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = AIEngine()
+    return _engine
@@ -4,4 +4,6 @@ from django.apps import AppConfig
 class ChatAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat_app'
-
+    
+    def ready(self):
+        from . import signals  # noqa: F401
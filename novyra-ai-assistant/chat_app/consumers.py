@@ -1,18 +1,71 @@
 """WebSocket consumers for real-time chat"""
-import json
+import asyncio
+import logging
+import time
+import orjson
 from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import async_to_sync
 from channels.db import database_sync_to_async
+from django.db import IntegrityError, transaction
 from .models import ChatSession, Message
-from .ai_engine import AIEngine
+from .ai_engine import get_engine
 from .escalation import EscalationHandler
 
+logger = logging.getLogger(__name__)
+
+
+def _dumps_json(obj) -> str:
+    """Compact JSON text for a WebSocket frame"""
+    return orjson.dumps(obj).decode()
+
+
+def chat_message_event(message, message_type='ai', confidence=None, intent=None, escalation_triggered=False,
+                       sender_name=None, sender_profile_picture=None, message_id=None):
+    """Build a chat_message channel-layer event, serializing the client payload once for every socket in the group"""
+    return {
+        'type': 'chat_message',
+        'payload_json': _dumps_json({
+            'message': message,
+            'message_type': message_type,
+            'confidence': confidence,
+            'intent': intent,
+            'escalation_triggered': escalation_triggered,
+            'sender_name': sender_name,
+            'sender_profile_picture': sender_profile_picture,
+            'message_id': message_id,
+        }),
+    }
+
+
+def agent_connected_event(agent_name, agent_username, message):
+    """Build an agent_connected channel-layer event with its client payload pre-serialized"""
+    return {
+        'type': 'agent_connected',
+        'payload_json': _dumps_json({
+            'type': 'agent_connected',
+            'agent_name': agent_name,
+            'agent_username': agent_username,
+            'message': message,
+            'agent_connected': True,
+        }),
+    }
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for real-time chat"""
     
+    # Queued frames per socket beyond which streamed deltas are dropped; complete messages
+    # are always queued, since the client needs them to replace the partial text
+    OUTBOX_SIZE = 256
+    # Streamed AI text is broadcast once this many characters are pending, or this long after the last send
+    DELTA_FLUSH_CHARS = 64
+    DELTA_FLUSH_INTERVAL = 0.25  # seconds
+    
     async def connect(self):
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.room_group_name = f'chat_{self.session_id}'
+        self._background_tasks = set()  # Strong references to fire-and-forget DB writes
+        self._session = None  # ChatSession, loaded on first message
         
         # Join room group
         await self.channel_layer.group_add(
@@ -21,17 +74,43 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        # Broadcast frames go through a queue drained by a relay task, so a slow
+        # client never blocks this consumer's group dispatch
+        self._outbox = asyncio.Queue()
+        self._relay_task = asyncio.create_task(self._relay())
     
     async def disconnect(self, close_code):
+        relay_task = getattr(self, '_relay_task', None)
+        if relay_task:
+            relay_task.cancel()
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
     
+    async def _relay(self):
+        """Send queued frames to the WebSocket in order"""
+        while True:
+            payload = await self._outbox.get()
+            try:
+                await self.send(text_data=payload)
+            except Exception:
+                logger.exception("Error sending WebSocket frame, stopping relay")
+                break
+    
+    def enqueue(self, payload, sheddable=False):
+        """Queue a pre-serialized frame for the relay task; sheddable frames are dropped if the client is too far behind"""
+        if sheddable and self._outbox.qsize() >= self.OUTBOX_SIZE:
+            logger.warning("WebSocket outbox full for room %s, dropping delta frame", self.room_group_name)
+            return
+        self._outbox.put_nowait(payload)
+    
     async def receive(self, text_data):
         """Receive message from WebSocket"""
-        data = json.loads(text_data)
+        data = orjson.loads(text_data)
         message = data.get('message', '')
         message_type = data.get('message_type', 'user')
         
@@ -43,43 +122,56 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     async def handle_user_message(self, message):
         """Handle user message and generate AI response"""
-        # Save user message
-        session = await self.get_session()
+        session = await self.get_cached_session()
         if not session:
-            await self.send(text_data=json.dumps({'error': 'Session not found'}))
+            await self.send(text_data=_dumps_json({'error': 'Session not found'}))
             return
         
+        # Save user message first, so conversation history and escalation see it
         await self.save_message(session, 'user', message)
         
         # Process with AI
-        ai_engine = AIEngine()
-        ai_response = ai_engine.generate_response(message, self.session_id)
-        
-        # Save AI response
-        await self.save_message(session, 'ai', ai_response['response'], 
-                               ai_response['confidence'], ai_response['intent'])
+        ai_response = await self.generate_ai_response(message)
         
         # Check escalation
         escalation_triggered = False
         if ai_response['escalation_needed']:
+            # Save AI response first, so it precedes the system message assign_agent may write
+            await self.save_message(session, 'ai', ai_response['response'],
+                                    ai_response['confidence'], ai_response['intent'])
             escalation_triggered = await self.handle_escalation(session)
         
         # Send AI response to room
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': ai_response['response'],
-                'message_type': 'ai',
-                'confidence': ai_response['confidence'],
-                'intent': ai_response['intent'],
-                'escalation_triggered': escalation_triggered,
-            }
+            chat_message_event(
+                ai_response['response'],
+                message_type='ai',
+                confidence=ai_response['confidence'],
+                intent=ai_response['intent'],
+                escalation_triggered=escalation_triggered,
+            )
         )
+        
+        # Nothing else is written this turn, so save AI response off the response critical path
+        if not ai_response['escalation_needed']:
+            self.run_in_background(self.save_message(session, 'ai', ai_response['response'],
+                                                     ai_response['confidence'], ai_response['intent']))
+    
+    def run_in_background(self, coro):
+        """Schedule a coroutine without awaiting it, keeping a reference and logging its failure"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+    
+    def _background_task_done(self, task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task failed", exc_info=task.exception())
     
     async def handle_agent_message(self, message, user_id):
         """Handle agent message"""
-        session = await self.get_session()
+        session = await self.get_cached_session()
         if not session:
             return
         
@@ -89,47 +181,63 @@ class ChatConsumer(AsyncWebsocketConsumer):
         try:
             await self.channel_layer.group_send(
                 self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message,
-                    'message_type': 'agent',
-                    'message_id': saved_message.id if saved_message else None,
-                }
+                chat_message_event(
+                    message,
+                    message_type='agent',
+                    message_id=saved_message.id if saved_message else None,
+                )
             )
-            print(f"✅ Agent message broadcasted to room {self.room_group_name}")
-        except Exception as e:
-            print(f"❌ Error broadcasting agent message: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.debug("Agent message broadcasted to room %s", self.room_group_name)
+        except Exception:
+            logger.exception("Error broadcasting agent message")
     
     async def chat_message(self, event):
-        """Send message to WebSocket"""
-        try:
-            await self.send(text_data=json.dumps({
-                'message': event.get('message', ''),
-                'message_type': event.get('message_type', 'ai'),
-                'confidence': event.get('confidence'),
-                'intent': event.get('intent'),
-                'escalation_triggered': event.get('escalation_triggered', False),
-                'sender_name': event.get('sender_name'),
-                'sender_profile_picture': event.get('sender_profile_picture'),
-                'message_id': event.get('message_id'),
-            }))
-            print(f"✅ WebSocket message delivered: {event.get('message_type')} message")
-        except Exception as e:
-            print(f"❌ Error in chat_message handler: {e}")
-            import traceback
-            traceback.print_exc()
+        """Send message to WebSocket (serialized once by chat_message_event)"""
+        self.enqueue(event['payload_json'])
+    
+    async def chat_message_delta(self, event):
+        """Send a partial AI response to WebSocket as it streams in (the full message follows as chat_message)"""
+        self.enqueue(event['payload_json'], sheddable=True)
     
     async def agent_connected(self, event):
-        """Send agent connection notification to WebSocket"""
-        await self.send(text_data=json.dumps({
-            'type': 'agent_connected',
-            'agent_name': event['agent_name'],
-            'agent_username': event['agent_username'],
-            'message': event['message'],
-            'agent_connected': True,
-        }))
+        """Send agent connection notification to WebSocket (serialized once by agent_connected_event)"""
+        self.enqueue(event['payload_json'])
+    
+    async def generate_ai_response(self, message):
+        # Forward DeepSeek text deltas to the room while the response streams in, coalesced
+        # so a reply costs a few dozen group sends rather than one per token. Text still
+        # pending at the end is covered by the final chat_message, which carries the full reply.
+        send_delta = async_to_sync(self.channel_layer.group_send)
+        pending = []
+        pending_chars = 0
+        last_sent = time.monotonic()
+        
+        def on_delta(delta):
+            nonlocal pending_chars, last_sent
+            pending.append(delta)
+            pending_chars += len(delta)
+            now = time.monotonic()
+            if pending_chars < self.DELTA_FLUSH_CHARS and now - last_sent < self.DELTA_FLUSH_INTERVAL:
+                return
+            send_delta(self.room_group_name, {
+                'type': 'chat_message_delta',
+                'payload_json': _dumps_json({'type': 'message_delta', 'delta': ''.join(pending)}),
+            })
+            pending.clear()
+            pending_chars = 0
+            last_sent = now
+        
+        # ORM queries and the DeepSeek HTTP call block, so run them in a worker thread;
+        # not thread-sensitive, so concurrent chats don't queue behind each other
+        return await database_sync_to_async(get_engine().generate_response, thread_sensitive=False)(
+            message, self.session_id, on_delta=on_delta
+        )
+    
+    async def get_cached_session(self):
+        """ChatSession for this socket - session_id is fixed, so it is looked up once per connection"""
+        if self._session is None:
+            self._session = await self.get_session()
+        return self._session
     
     @database_sync_to_async
     def get_session(self):
@@ -140,24 +248,24 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def save_message(self, session, message_type, content, confidence=None, intent=None, sender_id=None):
-        from django.contrib.auth.models import User
-        sender = None
-        if sender_id:
-            try:
-                sender = User.objects.get(id=sender_id)
-            except User.DoesNotExist:
-                pass
-        
-        return Message.objects.create(
+        fields = dict(
             session=session,
             message_type=message_type,
             content=content,
-            sender=sender,
             ai_confidence=confidence,
             intent_detected=intent,
         )
+        # Set the FK column directly; an unknown user id only fails the constraint check
+        try:
+            with transaction.atomic():
+                return Message.objects.create(sender_id=sender_id or None, **fields)
+        except IntegrityError:
+            return Message.objects.create(sender=None, **fields)
     
     @database_sync_to_async
     def handle_escalation(self, session):
+        # The cached session may be stale (e.g. an agent was assigned over HTTP);
+        # assign_agent only reads and writes these columns
+        session.refresh_from_db(fields=['assigned_agent', 'status'])
         return EscalationHandler.assign_agent(session)
 
@@ -1,27 +1,130 @@
 """DeepSeek AI API Client for intelligent chat responses"""
 import requests
-import json
-from typing import Dict, List, Optional
+import hashlib
+import logging
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional
 from django.conf import settings
+from django.core.cache import cache
 
+try:
+    import ahocorasick
+except ImportError:  # Optional - falls back to plain substring scans
+    ahocorasick = None
 
-class DeepSeekClient:
-    """Client for interacting with DeepSeek AI API"""
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = 3600  # seconds
+# Bump whenever _BASE_SYSTEM_PROMPT changes, so responses cached under the old prompt are ignored
+PROMPT_VERSION = 1
+
+
+# Keyword tables: tag -> phrases looked for in the lowercased user message
+_USER_KEYWORDS = {
+    # Explicit agent requests
+    'explicit_agent': (
+        'i want to speak with an agent', 'i want to talk to an agent',
+        'connect me to an agent', 'connect me to a human',
+        'i need to speak with an agent', 'i need to talk to an agent',
+        'let me speak with an agent', 'let me talk to an agent',
+        'speak with an agent', 'talk to an agent', 'get an agent',
+        'i want a human', 'i need a human', 'real person', 'real human agent',
+    ),
+    'speak_with': ('speak with', 'talk to'),
+    'agent_word': ('agent', 'human', 'representative'),
+    # Purchase/ready to buy intent
+    'purchase': (
+        'i want to purchase', 'i want to buy', 'i\'m ready to buy',
+        'i\'m ready to purchase', 'sign me up', 'i want to sign up',
+        'i\'m ready to start', 'let\'s start the project', 'i want to proceed',
+    ),
+    # Serious complaints or issues
+    'complaint': (
+        'complaint', 'refund', 'cancel', 'dissatisfied', 'not happy',
+        'very frustrated', 'very angry', 'terrible service', 'bad experience',
+    ),
+    # Account-specific questions that require access
+    'account_specific': (
+        'my account status', 'my project status', 'my order status',
+        'check my account', 'my subscription status', 'my package status',
+    ),
+    # Intents, checked in _INTENT_ORDER
+    'pricing': ('price', 'cost', 'pricing', 'how much', 'package', 'plan'),
+    'service_inquiry': ('service', 'what do you', 'offer', 'provide', 'do you do'),
+    'social_media': ('social media', 'instagram', 'facebook', 'tiktok'),
+    'branding': ('branding', 'logo', 'brand identity'),
+    'campaigns': ('campaign', 'advertising', 'ads', 'paid media'),
+    'content': ('content', 'blog', 'seo', 'copywriting'),
+    'greeting': ('hi', 'hello', 'hey', 'good morning', 'good afternoon'),
+    'escalation': ('agent', 'human', 'speak with', 'talk to'),
+}
+
+_INTENT_ORDER = ('pricing', 'service_inquiry', 'social_media', 'branding', 'campaigns', 'content', 'greeting', 'escalation')
+
+# Keyword tables: tag -> phrases looked for in the lowercased AI response
+_RESPONSE_KEYWORDS = {
+    'escalation_phrase': (
+        'connect you with', 'speak with an agent', 'connect to an agent',
+        'let me connect you', 'i\'ll connect you', 'transfer you to',
+        'connect you to one of our team', 'connect you to a team member',
+        'i\'ll connect you with', 'let me connect you with',
+    ),
+    'connect_offer': ('i\'d be happy to connect', 'let me connect'),
+    # DeepSeek explicitly can't help (account/project specific)
+    'failure': (
+        "i don't have access to your account",
+        "i cannot access your account",
+        "i don't have access to your specific",
+        "i don't have that information in your account",
+        "i can't check your account",
+        "requires access to your account",
+        "need to check your account details",
+        "i don't have access to your project",
+        "i can't access your order",
+        "i don't have access to your subscription",
+    ),
+    'suggests_connect': ('connect you with', 'speak with an agent', 'let me connect you'),
+    'helpful_word': ('help', 'assist', 'answer', 'information', 'service'),
+}
+
+
+class _KeywordMatcher:
+    """Finds which tags of a keyword table occur in a text, with one Aho-Corasick scan if available"""
     
-    def __init__(self):
-        self.api_key = getattr(settings, 'DEEPSEEK_API_KEY', None)
-        self.api_base = getattr(settings, 'DEEPSEEK_API_BASE', 'https://api.deepseek.com')
-        self.model = getattr(settings, 'DEEPSEEK_MODEL', 'deepseek-chat')
-        self.use_deepseek = getattr(settings, 'USE_DEEPSEEK_AI', True)
-        
-        if not self.api_key:
-            print("⚠️ Warning: DEEPSEEK_API_KEY not set. DeepSeek AI will be disabled.")
-            self.use_deepseek = False
+    def __init__(self, table: Dict[str, tuple]):
+        keyword_tags = {}
+        for tag, keywords in table.items():
+            for kw in keywords:
+                keyword_tags.setdefault(kw, []).append(tag)
+        self._keyword_tags = {kw: tuple(tags) for kw, tags in keyword_tags.items()}
+        
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for kw, tags in self._keyword_tags.items():
+                self._automaton.add_word(kw, tags)
+            self._automaton.make_automaton()
     
-    def _build_system_prompt(self, context: Optional[Dict] = None) -> str:
-        """Build comprehensive system prompt for Novyra Marketing Agency"""
-        
-        system_prompt = """You are Novyra, an intelligent and engaging AI customer support assistant for Novyra Marketing Agency. You are friendly, conversational, and helpful. Your name is "Novyra" and you represent the agency as a digital assistant. You should engage in natural, human-like conversations while being professional and informative.
+    def tags(self, text: str) -> FrozenSet[str]:
+        if self._automaton is None:
+            # Each distinct keyword is scanned once, however many tags share it
+            return frozenset(tag for kw, tags in self._keyword_tags.items() if kw in text for tag in tags)
+        return frozenset(tag for _, tags in self._automaton.iter(text) for tag in tags)
+
+
+_USER_MATCHER = _KeywordMatcher(_USER_KEYWORDS)
+_RESPONSE_MATCHER = _KeywordMatcher(_RESPONSE_KEYWORDS)
+
+
+class _Classification(NamedTuple):
+    """Keyword tags matched in a user message and the AI response to it"""
+    user_tags: FrozenSet[str]
+    response_tags: FrozenSet[str]
+
+# Static part of the system prompt, built once at import
+_BASE_SYSTEM_PROMPT = """You are Novyra, an intelligent and engaging AI customer support assistant for Novyra Marketing Agency. You are friendly, conversational, and helpful. Your name is "Novyra" and you represent the agency as a digital assistant. You should engage in natural, human-like conversations while being professional and informative.
 
 **Your Personality:**
 - You are Novyra, an AI assistant for Novyra Marketing Agency
@@ -157,29 +260,75 @@ When you need to escalate, use phrases like:
 - If you don't know something specific, be honest but try to help with what you do know
 - Focus on being helpful and engaging - make customers feel heard and assisted
 - NEVER say "I can't answer that" or "I don't have confidence" - instead, answer to the best of your ability"""
+
+
+class DeepSeekClient:
+    """Client for interacting with DeepSeek AI API"""
+    
+    def __init__(self):
+        self.api_key = getattr(settings, 'DEEPSEEK_API_KEY', None)
+        self.api_base = getattr(settings, 'DEEPSEEK_API_BASE', 'https://api.deepseek.com')
+        self.model = getattr(settings, 'DEEPSEEK_MODEL', 'deepseek-chat')
+        self.use_deepseek = getattr(settings, 'USE_DEEPSEEK_AI', True)
         
-        # Add context if provided
-        if context:
-            context_info = []
-            if context.get('last_intent'):
-                context_info.append(f"Previous conversation topic: {context['last_intent']}")
-            if context.get('package_selected'):
-                context_info.append(f"Customer showed interest in: {context['package_selected']}")
-            if context_info:
-                system_prompt += f"\n\n**Conversation Context:**\n" + "\n".join(context_info)
+        if not self.api_key:
+            logger.warning("DEEPSEEK_API_KEY not set. DeepSeek AI will be disabled.")
+            self.use_deepseek = False
         
-        return system_prompt
+        # Long-lived session so API calls reuse pooled keep-alive connections
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            # Completions are billed POSTs: retry only when the request never reached the
+            # API (connect errors) or was rejected by rate limiting, never after a read
+            # timeout or 5xx where the completion may already have run
+            max_retries=Retry(
+                total=2,
+                connect=2,
+                read=0,
+                backoff_factor=0.3,
+                status_forcelist=[429],
+                allowed_methods=frozenset({'POST'}),
+                raise_on_status=False,
+            ),
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+    
+    def _build_context_prompt(self, context: Optional[Dict] = None) -> Optional[str]:
+        """Build the per-turn conversation context, sent apart from the static system prompt"""
+        if not context:
+            return None
+        
+        context_info = []
+        if context.get('last_intent'):
+            context_info.append(f"Previous conversation topic: {context['last_intent']}")
+        if context.get('package_selected'):
+            context_info.append(f"Customer showed interest in: {context['package_selected']}")
+        if not context_info:
+            return None
+        
+        return "**Conversation Context:**\n" + "\n".join(context_info)
     
     def generate_response(
         self, 
         user_message: str, 
         conversation_history: Optional[List[Dict]] = None,
         context: Optional[Dict] = None,
-        is_business_hours: bool = True
+        is_business_hours: bool = True,
+        on_delta: Optional[Callable[[str], None]] = None
     ) -> Dict:
         """
         Generate intelligent response using DeepSeek AI
         
+        If on_delta is given, the completion is streamed and each text delta is
+        passed to it as it arrives; the full response is still returned.
+        
         Returns:
             {
                 'response': str,
@@ -198,11 +347,12 @@ When you need to escalate, use phrases like:
             }
         
         try:
-            # Build messages for API
+            # Build messages for API. The static system prompt and the history come first and
+            # only grow turn by turn, so DeepSeek's prefix cache can reuse them
             messages = [
                 {
                     "role": "system",
-                    "content": self._build_system_prompt(context)
+                    "content": _BASE_SYSTEM_PROMPT
                 }
             ]
             
@@ -215,57 +365,77 @@ When you need to escalate, use phrases like:
                         "content": msg.get('content', '')
                     })
             
+            # Volatile per-turn context goes after the cacheable prefix
+            context_prompt = self._build_context_prompt(context)
+            if context_prompt:
+                messages.append({
+                    "role": "system",
+                    "content": context_prompt
+                })
+            
             # Add current user message
             messages.append({
                 "role": "user",
                 "content": user_message
             })
             
+            # First-turn questions (FAQ-style) are answered from the response cache
+            cache_key = self._response_cache_key(user_message, conversation_history, context_prompt)
+            cached = cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                if on_delta is not None:
+                    on_delta(cached['response'])
+                return cached
+            
             # Make API request (DeepSeek uses OpenAI-compatible API)
             url = f"{self.api_base}/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
             
             payload = {
                 "model": self.model,
                 "messages": messages,
                 "temperature": 0.7,
                 "max_tokens": 1000,
-                "stream": False
+                "stream": on_delta is not None
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            ai_response = result['choices'][0]['message']['content']
+            if on_delta is not None:
+                ai_response = self._stream_completion(url, payload, on_delta)
+            else:
+                response = self._session.post(url, data=orjson.dumps(payload), timeout=30)
+                response.raise_for_status()
+                
+                result = orjson.loads(response.content)
+                ai_response = result['choices'][0]['message']['content']
+            ai_response = ai_response.strip()  # Once, for both the analysis and the returned text
             
             # Analyze response to determine escalation and intent
             # Only escalate if user explicitly requests OR DeepSeek indicates it truly can't help
-            should_escalate = self._should_escalate(user_message, ai_response)
-            intent = self._detect_intent(user_message, ai_response)
+            classification = self._classify(user_message, ai_response)
+            should_escalate = self._should_escalate(classification)
+            intent = self._detect_intent(classification)
             
             # Check if DeepSeek response indicates it can't help (low confidence indicators)
-            deepseek_failed = self._detect_deepseek_failure(ai_response)
+            deepseek_failed = self._detect_deepseek_failure(ai_response, classification)
             
             # Only escalate if: user explicitly wants agent OR DeepSeek truly failed
             final_escalation = should_escalate or deepseek_failed
             
             confidence = 0.9 if final_escalation else 0.85  # High confidence for DeepSeek responses
             
-            return {
-                'response': ai_response.strip(),
+            result = {
+                'response': ai_response,
                 'confidence': confidence,
                 'should_escalate': final_escalation,
                 'intent': intent,
                 'error': None,
                 'deepseek_failed': deepseek_failed
             }
+            if cache_key:
+                cache.set(cache_key, result, RESPONSE_CACHE_TTL)
+            return result
             
         except requests.exceptions.RequestException as e:
-            print(f"❌ DeepSeek API Error: {e}")
+            logger.error("DeepSeek API Error: %s", e)
             return {
                 'response': None,
                 'confidence': 0.0,
@@ -274,9 +444,7 @@ When you need to escalate, use phrases like:
                 'error': str(e)
             }
         except Exception as e:
-            print(f"❌ Unexpected error in DeepSeek client: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Unexpected error in DeepSeek client")
             return {
                 'response': None,
                 'confidence': 0.0,
@@ -285,151 +453,91 @@ When you need to escalate, use phrases like:
                 'error': str(e)
             }
     
-    def _should_escalate(self, user_message: str, ai_response: str) -> bool:
+    def _response_cache_key(self, user_message: str, conversation_history: Optional[List[Dict]],
+                            context_prompt: Optional[str]) -> Optional[str]:
+        """Cache key for a first-turn exchange, or None when earlier history makes the response session-specific"""
+        history = conversation_history or []
+        if history and history[-1].get('type') == 'user' and history[-1].get('content') == user_message:
+            history = history[:-1]  # The current message, already stored by the caller
+        if history:
+            return None
+        
+        key_text = '\0'.join((user_message.strip().lower(), context_prompt or ''))
+        return f"deepseek:response:{PROMPT_VERSION}:{hashlib.blake2s(key_text.encode()).hexdigest()}"
+    
+    def _stream_completion(self, url: str, payload: Dict, on_delta: Callable[[str], None]) -> str:
+        """POST a streaming chat completion, passing each content delta to on_delta; returns the full text"""
+        parts = []
+        with self._session.post(url, data=orjson.dumps(payload), timeout=30, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = 'utf-8'  # text/event-stream has no charset, requests would assume latin-1
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-sent events: "data: {...}" frames, terminated by "data: [DONE]"
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                delta = orjson.loads(data)['choices'][0].get('delta', {}).get('content')
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+        return ''.join(parts)
+    
+    def _classify(self, user_message: str, ai_response: str) -> _Classification:
+        """Match every keyword table against the message and response in one pass each"""
+        return _Classification(
+            _USER_MATCHER.tags(user_message.lower()),
+            _RESPONSE_MATCHER.tags(ai_response.lower()),
+        )
+    
+    def _should_escalate(self, classification: _Classification) -> bool:
         """Determine if conversation should be escalated to agent - Only when truly needed"""
-        user_lower = user_message.lower()
-        response_lower = ai_response.lower()
+        user_tags = classification.user_tags
+        response_tags = classification.response_tags
         
         # ONLY escalate for explicit agent requests (highest priority)
         # Be very specific - don't escalate for casual mentions
-        explicit_agent_keywords = [
-            'i want to speak with an agent', 'i want to talk to an agent',
-            'connect me to an agent', 'connect me to a human',
-            'i need to speak with an agent', 'i need to talk to an agent',
-            'let me speak with an agent', 'let me talk to an agent',
-            'speak with an agent', 'talk to an agent', 'get an agent',
-            'i want a human', 'i need a human', 'real person', 'real human agent'
-        ]
-        
-        # Check for explicit agent requests (must be clear intent)
-        has_explicit_request = any(keyword in user_lower for keyword in explicit_agent_keywords)
+        if 'explicit_agent' in user_tags:
+            return True
         
         # Also check for "speak with" or "talk to" followed by agent/human
-        if 'speak with' in user_lower or 'talk to' in user_lower:
-            if 'agent' in user_lower or 'human' in user_lower or 'representative' in user_lower:
-                has_explicit_request = True
-        
-        if has_explicit_request:
+        if 'speak_with' in user_tags and 'agent_word' in user_tags:
             return True
         
         # Check if AI response explicitly suggests escalation (AI decided it can't help)
-        escalation_phrases = [
-            'connect you with', 'speak with an agent', 'connect to an agent',
-            'let me connect you', 'i\'ll connect you', 'transfer you to',
-            'connect you to one of our team', 'connect you to a team member',
-            'i\'ll connect you with', 'let me connect you with'
-        ]
-        
         # Only escalate if AI explicitly says to connect AND it's not just a general offer
-        if any(phrase in response_lower for phrase in escalation_phrases):
-            # Make sure it's a clear escalation intent, not just mentioning it
-            if 'i\'d be happy to connect' in response_lower or 'let me connect' in response_lower:
-                return True
-        
-        # Purchase/ready to buy intent (needs human to close the deal)
-        purchase_keywords = [
-            'i want to purchase', 'i want to buy', 'i\'m ready to buy',
-            'i\'m ready to purchase', 'sign me up', 'i want to sign up',
-            'i\'m ready to start', 'let\'s start the project', 'i want to proceed'
-        ]
-        
-        if any(keyword in user_lower for keyword in purchase_keywords):
+        if 'escalation_phrase' in response_tags and 'connect_offer' in response_tags:
             return True
         
-        # Serious complaints or issues
-        serious_complaint_keywords = [
-            'complaint', 'refund', 'cancel', 'dissatisfied', 'not happy',
-            'very frustrated', 'very angry', 'terrible service', 'bad experience'
-        ]
-        
-        if any(keyword in user_lower for keyword in serious_complaint_keywords):
-            return True
-        
-        # Account-specific questions that require access
-        account_specific_keywords = [
-            'my account status', 'my project status', 'my order status',
-            'check my account', 'my subscription status', 'my package status'
-        ]
-        
-        if any(keyword in user_lower for keyword in account_specific_keywords):
+        # Purchase/ready to buy intent (needs human to close the deal), serious complaints or issues,
+        # and account-specific questions that require access
+        if not user_tags.isdisjoint(('purchase', 'complaint', 'account_specific')):
             return True
         
         # Default: Don't escalate - let AI handle it
         return False
     
-    def _detect_deepseek_failure(self, ai_response: str) -> bool:
-        """Detect if DeepSeek AI truly failed to answer (not just user asking for agent)"""
-        response_lower = ai_response.lower()
+    def _detect_deepseek_failure(self, ai_response: str, classification: _Classification) -> bool:
+        """Detect if DeepSeek AI truly failed to answer (not just user asking for agent); ai_response is already stripped"""
+        response_tags = classification.response_tags
         
         # STRICT: Only consider it a failure if DeepSeek explicitly says it can't help
-        # Not just because it suggests connecting - that might be normal
-        failure_indicators = [
-            "i don't have access to your account",
-            "i cannot access your account",
-            "i don't have access to your specific",
-            "i don't have that information in your account",
-            "i can't check your account",
-            "requires access to your account",
-            "need to check your account details",
-            "i don't have access to your project",
-            "i can't access your order",
-            "i don't have access to your subscription"
-        ]
-        
-        # Check if response contains STRICT failure indicators (account/project specific)
-        has_failure_indicator = any(indicator in response_lower for indicator in failure_indicators)
-        
-        # Also check if response is extremely short and suggests connecting
-        # But only if it's clearly unhelpful
-        is_too_short = len(ai_response.strip()) < 20
-        suggests_connect = any(phrase in response_lower for phrase in [
-            'connect you with', 'speak with an agent', 'let me connect you'
-        ])
-        
-        # VERY STRICT: Only consider it a failure if:
-        # 1. Has explicit account/project access failure indicators, OR
-        # 2. Response is extremely short AND suggests connecting AND doesn't answer the question
-        if has_failure_indicator:
+        # (account/project specific) - not just because it suggests connecting
+        if 'failure' in response_tags:
             return True
         
         # Only if response is extremely unhelpful (very short + suggests connecting + no actual answer)
-        if is_too_short and suggests_connect and not any(word in response_lower for word in ['help', 'assist', 'answer', 'information', 'service']):
+        is_too_short = len(ai_response) < 20
+        if is_too_short and 'suggests_connect' in response_tags and 'helpful_word' not in response_tags:
             return True
         
         return False
     
-    def _detect_intent(self, user_message: str, ai_response: str) -> str:
+    def _detect_intent(self, classification: _Classification) -> str:
         """Detect intent from user message"""
-        user_lower = user_message.lower()
-        
-        # Pricing intent
-        if any(word in user_lower for word in ['price', 'cost', 'pricing', 'how much', 'package', 'plan']):
-            return 'pricing'
-        
-        # Service inquiry
-        if any(word in user_lower for word in ['service', 'what do you', 'offer', 'provide', 'do you do']):
-            return 'service_inquiry'
-        
-        # Specific service intents
-        if any(word in user_lower for word in ['social media', 'instagram', 'facebook', 'tiktok']):
-            return 'social_media'
-        
-        if any(word in user_lower for word in ['branding', 'logo', 'brand identity']):
-            return 'branding'
-        
-        if any(word in user_lower for word in ['campaign', 'advertising', 'ads', 'paid media']):
-            return 'campaigns'
-        
-        if any(word in user_lower for word in ['content', 'blog', 'seo', 'copywriting']):
-            return 'content'
-        
-        # Greeting
-        if any(word in user_lower for word in ['hi', 'hello', 'hey', 'good morning', 'good afternoon']):
-            return 'greeting'
-        
-        # Escalation
-        if any(word in user_lower for word in ['agent', 'human', 'speak with', 'talk to']):
-            return 'escalation'
-        
+        user_tags = classification.user_tags
+        for intent in _INTENT_ORDER:
+            if intent in user_tags:
+                return intent
         return 'general'
-
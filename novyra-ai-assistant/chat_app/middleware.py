@@ -1,9 +1,49 @@
 """Middleware for tracking user logins"""
 import re
+from functools import lru_cache
+from django.core.cache import cache
 from django.utils import timezone
 from django.conf import settings
 from .models import LoginHistory, UserProfile
 
+# How long a session stays marked as already tracked before the DB is checked again
+LOGIN_TRACKED_TTL = 86400
+
+# Every device/browser marker parse_user_agent looks at; the lookahead also reports overlapping markers
+_UA_TOKEN_RE = re.compile(r'(?=(Mobile|Android|Tablet|iPad|Windows|Mac|Linux|Chrome|Edg|Firefox|Safari|Opera))')
+
+
+@lru_cache(maxsize=1024)
+def _parse_user_agent(user_agent):
+    """Device and browser for a user agent string, from one regex scan (browsers repeat the same UA)"""
+    tokens = set(_UA_TOKEN_RE.findall(user_agent))
+    
+    device = 'Unknown'
+    if 'Mobile' in tokens or 'Android' in tokens:
+        device = 'Mobile'
+    elif 'Tablet' in tokens or 'iPad' in tokens:
+        device = 'Tablet'
+    elif 'Windows' in tokens:
+        device = 'Windows'
+    elif 'Mac' in tokens:
+        device = 'Mac'
+    elif 'Linux' in tokens:
+        device = 'Linux'
+    
+    browser = 'Unknown'
+    if 'Chrome' in tokens and 'Edg' not in tokens:
+        browser = 'Chrome'
+    elif 'Firefox' in tokens:
+        browser = 'Firefox'
+    elif 'Safari' in tokens and 'Chrome' not in tokens:
+        browser = 'Safari'
+    elif 'Edg' in tokens:
+        browser = 'Edge'
+    elif 'Opera' in tokens:
+        browser = 'Opera'
+    
+    return device, browser
+
 
 class LoginTrackingMiddleware:
     """Track user logins and create user profiles"""
@@ -15,13 +55,14 @@ class LoginTrackingMiddleware:
         # Track login if user is authenticated
         if request.user.is_authenticated:
             session_key = request.session.session_key
-            if session_key:
+            tracked_key = f'login_tracked:{request.user.pk}:{session_key}'
+            if session_key and not cache.get(tracked_key):
                 # Check if this is a new login (no recent login history for this session)
                 recent_login = LoginHistory.objects.filter(
                     user=request.user,
                     session_key=session_key,
                     logout_time__isnull=True
-                ).first()
+                ).exists()
                 
                 if not recent_login:
                     # New login - create login history
@@ -38,8 +79,10 @@ class LoginTrackingMiddleware:
                         session_key=session_key
                     )
                     
-                    # Create user profile if it doesn't exist
-                    UserProfile.objects.get_or_create(user=request.user)
+                    # Create user profile if it doesn't exist; the unique user column turns a duplicate into a no-op
+                    UserProfile.objects.bulk_create([UserProfile(user=request.user)], ignore_conflicts=True)
+                
+                cache.set(tracked_key, True, LOGIN_TRACKED_TTL)
         
         response = self.get_response(request)
         return response
@@ -55,32 +98,6 @@ class LoginTrackingMiddleware:
     
     def parse_user_agent(self, user_agent):
         """Parse user agent to extract device and browser"""
-        device = 'Unknown'
-        browser = 'Unknown'
-        
-        if user_agent:
-            # Detect device
-            if 'Mobile' in user_agent or 'Android' in user_agent:
-                device = 'Mobile'
-            elif 'Tablet' in user_agent or 'iPad' in user_agent:
-                device = 'Tablet'
-            elif 'Windows' in user_agent:
-                device = 'Windows'
-            elif 'Mac' in user_agent:
-                device = 'Mac'
-            elif 'Linux' in user_agent:
-                device = 'Linux'
-            
-            # Detect browser
-            if 'Chrome' in user_agent and 'Edg' not in user_agent:
-                browser = 'Chrome'
-            elif 'Firefox' in user_agent:
-                browser = 'Firefox'
-            elif 'Safari' in user_agent and 'Chrome' not in user_agent:
-                browser = 'Safari'
-            elif 'Edg' in user_agent:
-                browser = 'Edge'
-            elif 'Opera' in user_agent:
-                browser = 'Opera'
-        
-        return device, browser
+        if not user_agent:
+            return 'Unknown', 'Unknown'
+        return _parse_user_agent(user_agent)
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-15 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat_app", "0013_notification_badge_count_notification_sound_played"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chatsession",
+            index=models.Index(fields=["status"], name="chat_app_ch_status_796994_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="chatsession",
+            index=models.Index(
+                fields=["created_at"], name="chat_app_ch_created_012769_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["message_type"], name="chat_app_me_message_22743d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["created_at"], name="chat_app_me_created_a6d6ce_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loginhistory",
+            index=models.Index(
+                fields=["login_time"], name="chat_app_lo_login_t_fe4b17_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["notification_type"], name="chat_app_no_notific_9ee060_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["created_at"], name="chat_app_no_created_6d51d7_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(
+                fields=["priority"], name="chat_app_ti_priorit_bc6b98_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(
+                fields=["created_at"], name="chat_app_ti_created_a9e98b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversationlearning",
+            index=models.Index(
+                fields=["created_at"], name="chat_app_co_created_ca7d56_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="websitecontent",
+            index=models.Index(
+                fields=["last_scraped"], name="chat_app_we_last_sc_2656ad_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Trigram index backing AIEngine.learn_from_past_conversations on PostgreSQL
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS chat_app_co_user_me_trgm_idx "
+        "ON chat_app_conversationlearning USING gin (user_message gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS chat_app_co_user_me_trgm_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat_app", "0014_add_admin_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,24 @@
+# Backfill Agent profiles for existing staff users; new ones get theirs from signals.ensure_agent_profile
+
+from django.db import migrations
+
+
+def create_missing_agent_profiles(apps, schema_editor):
+    User = apps.get_model("auth", "User")
+    Agent = apps.get_model("chat_app", "Agent")
+    missing = User.objects.filter(is_staff=True, is_active=True, agent_profile__isnull=True)
+    Agent.objects.bulk_create(
+        [Agent(user=user, is_available=True, max_concurrent_chats=5, current_chats=0) for user in missing],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("chat_app", "0015_conversationlearning_user_message_trgm"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_agent_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0016_backfill_staff_agent_profiles'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['is_available', 'current_chats'], name='chat_app_ag_is_avai_3dfd8f_idx'),
+        ),
+    ]
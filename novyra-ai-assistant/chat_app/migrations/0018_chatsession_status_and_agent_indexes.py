@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0017_agent_is_available_current_chats_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatsession',
+            name='chat_app_ch_status_796994_idx',
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['status', '-created_at'], name='chat_app_ch_status_eb7b34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['assigned_agent', 'status'], name='chat_app_ch_assigne_4219dc_idx'),
+        ),
+    ]
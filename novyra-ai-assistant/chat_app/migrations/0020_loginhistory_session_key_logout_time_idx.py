@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0019_message_partial_unread_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginhistory',
+            index=models.Index(fields=['session_key', 'logout_time'], name='chat_app_lo_session_c20175_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-15 23:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0020_loginhistory_session_key_logout_time_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='chat_app_me_message_22743d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='chat_app_me_created_a6d6ce_idx',
+        ),
+    ]
@@ -1,5 +1,6 @@
 """Consolidated models for Chat App"""
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -37,7 +38,7 @@ class ChatSession(models.Model):
     
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['session_id', 'status'])]
+        indexes = [models.Index(fields=['session_id', 'status']), models.Index(fields=['status', '-created_at']), models.Index(fields=['assigned_agent', 'status']), models.Index(fields=['created_at'])]
     
     def __str__(self):
         return f"Session {self.session_id} - {self.status}"
@@ -68,7 +69,7 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['created_at']
-        indexes = [models.Index(fields=['session', 'created_at']), models.Index(fields=['is_read', 'created_at'])]
+        indexes = [models.Index(fields=['session', 'created_at']), models.Index(fields=['session', 'created_at'], condition=Q(is_read=False), name='chat_app_me_unread_idx')]
     
     def __str__(self):
         return f"{self.message_type} - {self.session.session_id}"
@@ -112,6 +113,9 @@ class Agent(models.Model):
     average_rating = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [models.Index(fields=['is_available', 'current_chats'])]
+    
     def __str__(self):
         return f"Agent: {self.user.username}"
 
@@ -212,6 +216,7 @@ class LoginHistory(models.Model):
     class Meta:
         ordering = ['-login_time']
         verbose_name_plural = 'Login Histories'
+        indexes = [models.Index(fields=['login_time']), models.Index(fields=['session_key', 'logout_time'])]
     
     def __str__(self):
         return f"{self.user.username} - {self.login_time}"
@@ -239,7 +244,7 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['user', 'is_read', 'created_at'])]
+        indexes = [models.Index(fields=['user', 'is_read', 'created_at']), models.Index(fields=['notification_type']), models.Index(fields=['created_at'])]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
@@ -279,7 +284,7 @@ class Ticket(models.Model):
     
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['status', 'priority', 'created_at']), models.Index(fields=['follow_up_date', 'status'])]
+        indexes = [models.Index(fields=['status', 'priority', 'created_at']), models.Index(fields=['follow_up_date', 'status']), models.Index(fields=['priority']), models.Index(fields=['created_at'])]
     
     def __str__(self):
         return f"Ticket {self.ticket_number} - {self.title}"
@@ -298,7 +303,7 @@ class ConversationLearning(models.Model):
     
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['intent_detected', 'was_helpful', 'created_at'])]
+        indexes = [models.Index(fields=['intent_detected', 'was_helpful', 'created_at']), models.Index(fields=['created_at'])]
     
     def __str__(self):
         return f"Learning: {self.intent_detected} - {self.created_at}"
@@ -358,7 +363,7 @@ class WebsiteContent(models.Model):
     
     class Meta:
         ordering = ['-last_scraped']
-        indexes = [models.Index(fields=['url', 'is_active'])]
+        indexes = [models.Index(fields=['url', 'is_active']), models.Index(fields=['last_scraped'])]
     
     def __str__(self):
         return f"{self.title or self.url} - {self.last_scraped}"
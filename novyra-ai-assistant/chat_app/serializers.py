@@ -1,82 +1,105 @@
 """DRF Serializers for Chat App"""
+import copy
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from .models import ChatSession, Message, KnowledgeBase, Agent, Analytics, UserProfile, LoginHistory, Notification, AgentChat, AgentMessage, AgentNote
 
+# Relations MessageSerializer reads per row; select_related these on Message querysets it renders
+MESSAGE_SELECT_RELATED = ('sender__user_profile', 'read_by__user_profile')
 
-class MessageSerializer(serializers.ModelSerializer):
-    attachment_url = serializers.SerializerMethodField()
-    sender_name = serializers.SerializerMethodField()
-    sender_profile_picture = serializers.SerializerMethodField()
-    read_by_profile_picture = serializers.SerializerMethodField()
-    read_by_name = serializers.SerializerMethodField()
+_DATETIME_FIELD = serializers.DateTimeField()
+
+
+def request_base_url(request):
+    """Scheme and host to prefix media URLs with (None without a request)"""
+    return request.build_absolute_uri('/').rstrip('/') if request else None
+
+
+def _context_base_url(context):
+    """request_base_url() for a serializer context, computed once and shared with nested serializers"""
+    if 'base_url' not in context:
+        context['base_url'] = request_base_url(context.get('request'))
+    return context['base_url']
+
+
+def _file_url(field_file, base_url=None):
+    """Absolute URL of an uploaded file when a base URL is available"""
+    if not field_file:
+        return None
+    url = field_file.url
+    # Storage URLs are root-relative (or already absolute), so a prefix is all build_absolute_uri would add
+    if base_url and url.startswith('/') and not url.startswith('//'):
+        return base_url + url
+    return url
+
+
+def _user_display_name(user):
+    """Full name of a user, falling back to the username"""
+    return f"{user.first_name} {user.last_name}".strip() or user.username
+
+
+def _user_profile_picture(user, base_url=None):
+    """Profile picture URL of a user, or None without a profile/picture"""
+    # The reverse one-to-one raises a DoesNotExist that is also an AttributeError, so getattr's default covers it
+    profile = getattr(user, 'user_profile', None)
+    return _file_url(profile.profile_picture, base_url) if profile else None
+
+
+def message_to_dict(message, base_url=None):
+    """API representation of a message, built directly so message lists skip DRF field overhead (MessageSerializer renders through it)"""
+    sender = message.sender
+    read_by = message.read_by
+    attachment_url = _file_url(message.attachment, base_url)
+    return {
+        'id': message.id,
+        'message_type': message.message_type,
+        'content': message.content,
+        'sender': message.sender_id,
+        'sender_name': _user_display_name(sender) if sender else None,
+        'sender_profile_picture': _user_profile_picture(sender, base_url) if sender else None,
+        'ai_confidence': message.ai_confidence,
+        'intent_detected': message.intent_detected,
+        'attachment': attachment_url,
+        'attachment_type': message.attachment_type,
+        'attachment_url': attachment_url,
+        'is_read': message.is_read,
+        'read_at': _DATETIME_FIELD.to_representation(message.read_at) if message.read_at else None,
+        'read_by': message.read_by_id,
+        'read_by_name': _user_display_name(read_by) if read_by else None,
+        'read_by_profile_picture': _user_profile_picture(read_by, base_url) if read_by else None,
+        'created_at': _DATETIME_FIELD.to_representation(message.created_at),
+    }
+
+
+class CachedFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that introspects its model fields once per class instead of on every instantiation"""
+    _fields_cache = {}
+    
+    def get_fields(self):
+        cls = type(self)
+        fields = cls._fields_cache.get(cls)
+        if fields is None:
+            fields = cls._fields_cache[cls] = super().get_fields()
+        # Deep copies, as DRF does for declared fields: nested serializers must not share a parent
+        return copy.deepcopy(fields)
+
+
+class MessageSerializer(CachedFieldsModelSerializer):
+    """Output comes from message_to_dict, the one definition of a message's API representation"""
     
     class Meta:
         model = Message
-        fields = ['id', 'message_type', 'content', 'sender', 'sender_name', 'sender_profile_picture', 
-                  'ai_confidence', 'intent_detected', 'attachment', 'attachment_type', 'attachment_url', 
-                  'is_read', 'read_at', 'read_by', 'read_by_name', 'read_by_profile_picture', 'created_at']
+        fields = ['id', 'message_type', 'content', 'sender', 'ai_confidence', 'intent_detected',
+                  'attachment', 'attachment_type', 'is_read', 'read_at', 'read_by', 'created_at']
         read_only_fields = ['id', 'created_at', 'is_read', 'read_at', 'read_by']
     
-    def get_attachment_url(self, obj):
-        if obj.attachment:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.attachment.url)
-            return obj.attachment.url
-        return None
-    
-    def get_sender_name(self, obj):
-        """Get sender name for agent messages"""
-        if obj.sender and hasattr(obj.sender, 'username'):
-            # If it's a user (agent), return their full name or username
-            if hasattr(obj.sender, 'first_name') and obj.sender.first_name:
-                full_name = f"{obj.sender.first_name} {obj.sender.last_name}".strip()
-                return full_name if full_name else obj.sender.username
-            return obj.sender.username
-        return None
-    
-    def get_sender_profile_picture(self, obj):
-        """Get sender profile picture URL"""
-        if obj.sender:
-            try:
-                profile = obj.sender.user_profile
-                if profile.profile_picture:
-                    request = self.context.get('request')
-                    if request:
-                        return request.build_absolute_uri(profile.profile_picture.url)
-                    return profile.profile_picture.url
-            except UserProfile.DoesNotExist:
-                pass
-        return None
-    
-    def get_read_by_profile_picture(self, obj):
-        """Get read_by profile picture URL for seen indicator"""
-        if obj.read_by:
-            try:
-                profile = obj.read_by.user_profile
-                if profile.profile_picture:
-                    request = self.context.get('request')
-                    if request:
-                        return request.build_absolute_uri(profile.profile_picture.url)
-                    return profile.profile_picture.url
-            except UserProfile.DoesNotExist:
-                pass
-        return None
-    
-    def get_read_by_name(self, obj):
-        """Get read_by name"""
-        if obj.read_by:
-            if hasattr(obj.read_by, 'first_name') and obj.read_by.first_name:
-                full_name = f"{obj.read_by.first_name} {obj.read_by.last_name}".strip()
-                return full_name if full_name else obj.read_by.username
-            return obj.read_by.username
-        return None
+    def to_representation(self, instance):
+        return message_to_dict(instance, _context_base_url(self.context))
 
 
-class ChatSessionSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+class ChatSessionSerializer(CachedFieldsModelSerializer):
+    messages = serializers.SerializerMethodField()
     assigned_agent_username = serializers.CharField(source='assigned_agent.username', read_only=True)
     
     class Meta:
@@ -85,22 +108,27 @@ class ChatSessionSerializer(serializers.ModelSerializer):
                   'customer_name', 'customer_email', 'customer_phone',
                   'created_at', 'updated_at', 'rating', 'feedback', 'messages']
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def get_messages(self, obj):
+        base_url = _context_base_url(self.context)
+        return [message_to_dict(message, base_url) for message in obj.messages.all()]
 
 
-class ChatSessionListSerializer(serializers.ModelSerializer):
+class ChatSessionListSerializer(CachedFieldsModelSerializer):
+    """Expects the message_count annotation and latest_messages prefetch from ChatSessionViewSet"""
     last_message = serializers.SerializerMethodField()
-    message_count = serializers.IntegerField(source='messages.count', read_only=True)
+    message_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = ChatSession
         fields = ['id', 'session_id', 'status', 'assigned_agent', 'customer_name', 'customer_email', 'customer_phone', 'created_at', 'last_message', 'message_count']
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        return MessageSerializer(last_msg, context=self.context).data if last_msg else None
+        last_msg = obj.latest_messages[0] if obj.latest_messages else None
+        return message_to_dict(last_msg, _context_base_url(self.context)) if last_msg else None
 
 
-class KnowledgeBaseSerializer(serializers.ModelSerializer):
+class KnowledgeBaseSerializer(CachedFieldsModelSerializer):
     class Meta:
         model = KnowledgeBase
         fields = ['id', 'title', 'category', 'keywords', 'content', 'intent', 'is_active', 'priority']
@@ -129,7 +157,7 @@ class ChatResponseSerializer(serializers.Serializer):
     escalation_triggered = serializers.BooleanField(default=False)
 
 
-class AgentSerializer(serializers.ModelSerializer):
+class AgentSerializer(CachedFieldsModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
@@ -144,26 +172,17 @@ class AgentSerializer(serializers.ModelSerializer):
     
     def get_profile_picture_url(self, obj):
         """Get agent profile picture URL"""
-        try:
-            profile = obj.user.user_profile
-            if profile.profile_picture:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(profile.profile_picture.url)
-                return profile.profile_picture.url
-        except UserProfile.DoesNotExist:
-            pass
-        return None
+        return _user_profile_picture(obj.user, _context_base_url(self.context))
 
 
-class AnalyticsSerializer(serializers.ModelSerializer):
+class AnalyticsSerializer(CachedFieldsModelSerializer):
     class Meta:
         model = Analytics
         fields = ['date', 'total_sessions', 'ai_resolved', 'agent_resolved', 
                   'average_response_time', 'average_rating', 'escalation_count']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(CachedFieldsModelSerializer):
     profile_picture_url = serializers.SerializerMethodField()
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
@@ -178,15 +197,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_profile_picture_url(self, obj):
-        if obj.profile_picture:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.profile_picture.url)
-            return obj.profile_picture.url
-        return None
+        return _file_url(obj.profile_picture, _context_base_url(self.context))
 
 
-class LoginHistorySerializer(serializers.ModelSerializer):
+class LoginHistorySerializer(CachedFieldsModelSerializer):
     class Meta:
         model = LoginHistory
         fields = ['id', 'ip_address', 'user_agent', 'device', 'browser', 
@@ -194,7 +208,7 @@ class LoginHistorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'login_time', 'logout_time']
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(CachedFieldsModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'notification_type', 'title', 'message', 'is_read', 
@@ -221,7 +235,7 @@ class UpdateProfileSerializer(serializers.Serializer):
     bio = serializers.CharField(required=False, allow_blank=True)
 
 
-class AgentMessageSerializer(serializers.ModelSerializer):
+class AgentMessageSerializer(CachedFieldsModelSerializer):
     sender = serializers.SerializerMethodField()
     attachment_url = serializers.SerializerMethodField()
     
@@ -236,20 +250,15 @@ class AgentMessageSerializer(serializers.ModelSerializer):
             return {
                 'id': obj.sender.id,
                 'username': obj.sender.username,
-                'name': f"{obj.sender.first_name} {obj.sender.last_name}".strip() or obj.sender.username
+                'name': _user_display_name(obj.sender)
             }
         return None
     
     def get_attachment_url(self, obj):
-        if obj.attachment:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.attachment.url)
-            return obj.attachment.url
-        return None
+        return _file_url(obj.attachment, _context_base_url(self.context))
 
 
-class AgentChatSerializer(serializers.ModelSerializer):
+class AgentChatSerializer(CachedFieldsModelSerializer):
     participants = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
@@ -264,12 +273,16 @@ class AgentChatSerializer(serializers.ModelSerializer):
         return [{
             'id': p.id,
             'username': p.username,
-            'name': f"{p.first_name} {p.last_name}".strip() or p.username,
+            'name': _user_display_name(p),
             'email': p.email
         } for p in obj.participants.all()]
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
+        # agent_chats_api prefetches latest_messages; a freshly created chat falls back to a query
+        if hasattr(obj, 'latest_messages'):
+            last_msg = obj.latest_messages[0] if obj.latest_messages else None
+        else:
+            last_msg = obj.messages.last()
         if last_msg:
             return AgentMessageSerializer(last_msg, context=self.context).data
         return None
@@ -277,11 +290,13 @@ class AgentChatSerializer(serializers.ModelSerializer):
     def get_unread_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'unread_message_count'):
+                return obj.unread_message_count
             return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
         return 0
 
 
-class AgentNoteSerializer(serializers.ModelSerializer):
+class AgentNoteSerializer(CachedFieldsModelSerializer):
     agent_username = serializers.CharField(source='agent.username', read_only=True)
     agent_name = serializers.SerializerMethodField()
     
@@ -292,8 +307,5 @@ class AgentNoteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_agent_name(self, obj):
-        if obj.agent:
-            full_name = f"{obj.agent.first_name} {obj.agent.last_name}".strip()
-            return full_name if full_name else obj.agent.username
-        return None
+        return _user_display_name(obj.agent) if obj.agent else None
 
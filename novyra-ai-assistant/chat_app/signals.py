@@ -0,0 +1,36 @@
+"""Signal handlers for Chat App"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .ai_engine import invalidate_knowledge_cache
+from .models import Agent, ChatWidgetConfig, KnowledgeBase, WebsiteContent
+from .utils import WIDGET_CONFIG_CACHE_KEY
+
+
+@receiver([post_save, post_delete], sender=KnowledgeBase)
+@receiver([post_save, post_delete], sender=WebsiteContent)
+def invalidate_ai_knowledge(sender, **kwargs):
+    """Make AIEngine reload its preprocessed KnowledgeBase/WebsiteContent rows"""
+    invalidate_knowledge_cache()
+
+
+@receiver([post_save, post_delete], sender=ChatWidgetConfig)
+def invalidate_widget_config(sender, **kwargs):
+    """Drop the cached widget_config_api response"""
+    cache.delete(WIDGET_CONFIG_CACHE_KEY)
+
+
+@receiver(post_save, sender=User)
+def ensure_agent_profile(sender, instance, raw=False, **kwargs):
+    """Give active staff users an Agent profile so escalation can assign them"""
+    if raw or not (instance.is_staff and instance.is_active):
+        return
+    Agent.objects.get_or_create(
+        user=instance,
+        defaults={
+            'is_available': True,
+            'max_concurrent_chats': 5,
+            'current_chats': 0
+        }
+    )
@@ -8,6 +8,9 @@ import requests
 from bs4 import BeautifulSoup
 from .models import Agent, BusinessHours, Ticket, ConversationLearning, Notification, ChatSession, WebsiteContent
 
+PUBLIC_API_CACHE_TTL = 60 * 15  # seconds
+WIDGET_CONFIG_CACHE_KEY = 'api:widget_config'
+
 
 def check_business_hours():
     """Check if current time is within business hours (WAT: 9am-6pm, Monday-Saturday)"""
@@ -77,20 +80,7 @@ def get_business_hours_message():
 def check_agent_availability():
     """Check if any agents are available"""
     try:
-        # Ensure Agent profiles exist for staff users
-        from django.contrib.auth.models import User
-        staff_users = User.objects.filter(is_staff=True, is_active=True)
-        for user in staff_users:
-            if not hasattr(user, 'agent_profile'):
-                Agent.objects.get_or_create(
-                    user=user,
-                    defaults={
-                        'is_available': True,
-                        'max_concurrent_chats': 5,
-                        'current_chats': 0
-                    }
-                )
-        
+        # Staff users get their Agent profile from the post_save signal in signals.py
         available_agents = Agent.objects.filter(
             is_available=True,
             user__is_active=True,
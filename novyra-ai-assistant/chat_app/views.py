@@ -9,25 +9,26 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Count, Avg, F, Prefetch
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import ChatSession, Message, KnowledgeBase, Agent, Analytics, UserProfile, LoginHistory, Notification, Ticket, ConversationLearning, ChatWidgetConfig, AgentChat, AgentMessage, AgentNote
 from .serializers import (
-    ChatSessionSerializer, ChatSessionListSerializer, MessageSerializer,
+    ChatSessionSerializer, ChatSessionListSerializer, MessageSerializer, MESSAGE_SELECT_RELATED, message_to_dict, request_base_url,
     ChatRequestSerializer, ChatResponseSerializer, KnowledgeBaseSerializer,
     AgentSerializer, AnalyticsSerializer, UserProfileSerializer,
     LoginHistorySerializer, NotificationSerializer, ChangePasswordSerializer,
-    UpdateProfileSerializer
+    UpdateProfileSerializer, AgentChatSerializer, AgentMessageSerializer, AgentNoteSerializer
 )
-from .ai_engine import AIEngine
+from .ai_engine import get_engine, knowledge_version
 from .escalation import EscalationHandler
 from .utils import (
     can_connect_to_agent, check_business_hours, scrape_website_content, create_default_faqs, check_agent_availability,
     create_ticket, save_conversation_learning, get_common_questions,
     get_business_hours_message, send_after_hours_email_notification,
-    mark_message_as_read, send_ticket_email_notification,
+    mark_message_as_read, send_ticket_email_notification, PUBLIC_API_CACHE_TTL, WIDGET_CONFIG_CACHE_KEY,
 )
 
 
@@ -44,13 +45,32 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = ChatSession.objects.all()
+        if self.action == 'list':
+            # The list serializer never shows these free-text columns, and reads the message
+            # count and latest message from here instead of querying per session.
+            # Meta.ordering is ignored once the Count adds a GROUP BY, so order explicitly.
+            queryset = queryset.defer('user_agent', 'feedback').annotate(
+                message_count=Count('messages'),
+            ).order_by('-created_at').prefetch_related(
+                Prefetch(
+                    'messages',
+                    queryset=Message.objects.select_related(*MESSAGE_SELECT_RELATED).order_by('-created_at')[:1],
+                    to_attr='latest_messages',
+                )
+            )
+        elif self.action == 'retrieve':
+            # ChatSessionSerializer renders every message with its sender/reader profiles
+            queryset = queryset.select_related('assigned_agent').prefetch_related(
+                Prefetch('messages', queryset=Message.objects.select_related(*MESSAGE_SELECT_RELATED))
+            )
         # Allow unauthenticated access in debug mode for testing
         if not user.is_authenticated and settings.DEBUG:
-            return ChatSession.objects.all()[:50]  # Limit for unauthenticated
+            return queryset[:50]  # Limit for unauthenticated
         # Agents see their assigned sessions, admins see all
         if user.is_staff:
-            return ChatSession.objects.all()
-        return ChatSession.objects.filter(assigned_agent=user)
+            return queryset
+        return queryset.filter(assigned_agent=user)
     
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
@@ -90,6 +110,7 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         try:
             from channels.layers import get_channel_layer
             from asgiref.sync import async_to_sync
+            from .consumers import chat_message_event
             
             channel_layer = get_channel_layer()
             if channel_layer:
@@ -101,14 +122,12 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
                 # Send via WebSocket
                 async_to_sync(channel_layer.group_send)(
                     room_group_name,
-                    {
-                        'type': 'chat_message',
-                        'message': content,
-                        'message_type': message_type,
-                        'sender_name': sender_name,
-                        'sender_profile_picture': None,
-                        'message_id': message.id,
-                    }
+                    chat_message_event(
+                        content,
+                        message_type=message_type,
+                        sender_name=sender_name,
+                        message_id=message.id,
+                    )
                 )
                 print(f"✅ WebSocket message sent: {message_type} message to room {room_group_name}")
         except Exception as e:
@@ -261,7 +280,7 @@ def chat_api(request):
             }
         else:
             # Process with AI engine - let DeepSeek AI answer questions intelligently
-            ai_engine = AIEngine()
+            ai_engine = get_engine()
             session_context = {
                 'last_intent': session.last_intent,
                 'package_selected': session.package_selected,
@@ -375,18 +394,18 @@ def chat_api(request):
             try:
                 from channels.layers import get_channel_layer
                 from asgiref.sync import async_to_sync
+                from .consumers import agent_connected_event
                 
                 channel_layer = get_channel_layer()
                 if channel_layer:
                     room_group_name = f'chat_{session.session_id}'
                     async_to_sync(channel_layer.group_send)(
                         room_group_name,
-                        {
-                            'type': 'agent_connected',
-                            'agent_name': assigned_agent_name,
-                            'agent_username': session.assigned_agent.username,
-                            'message': ai_response['response'],
-                        }
+                        agent_connected_event(
+                            assigned_agent_name,
+                            session.assigned_agent.username,
+                            ai_response['response'],
+                        )
                     )
             except Exception as e:
                 print(f"Error sending agent connection WebSocket: {e}")
@@ -504,12 +523,9 @@ def chat_api(request):
         # Get agent profile picture URL if agent is assigned
         assigned_agent_profile_picture = None
         if session.assigned_agent:
-            try:
-                profile = session.assigned_agent.user_profile
-                if profile.profile_picture:
-                    assigned_agent_profile_picture = request.build_absolute_uri(profile.profile_picture.url)
-            except UserProfile.DoesNotExist:
-                pass
+            profile = getattr(session.assigned_agent, 'user_profile', None)
+            if profile and profile.profile_picture:
+                assigned_agent_profile_picture = request.build_absolute_uri(profile.profile_picture.url)
         
         # Prepare response
         response_data = {
@@ -555,14 +571,14 @@ def get_session_messages(request, session_id):
         # Exclude system messages for regular users (they're for internal tracking)
         # Only show system messages to authenticated staff users
         if request.user.is_authenticated and request.user.is_staff:
-            messages = session.messages.all().order_by('created_at')
+            messages = session.messages.select_related(*MESSAGE_SELECT_RELATED).order_by('created_at')
             # Mark user messages as read when agent views them
             if request.user.is_staff:
                 unread_user_messages = messages.filter(message_type='user', is_read=False)
                 for message in unread_user_messages:
                     mark_message_as_read(message, request.user)
         else:
-            messages = session.messages.exclude(message_type='system').order_by('created_at')
+            messages = session.messages.exclude(message_type='system').select_related(*MESSAGE_SELECT_RELATED).order_by('created_at')
             # Mark agent messages as read when user views them
             if session.assigned_agent:
                 unread_agent_messages = messages.filter(message_type='agent', is_read=False)
@@ -570,8 +586,8 @@ def get_session_messages(request, session_id):
                 # In a real implementation, you might want to track read status differently for anonymous users
                 pass  # Skip auto-marking for anonymous users
         
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
-        return Response({'messages': serializer.data})
+        base_url = request_base_url(request)
+        return Response({'messages': [message_to_dict(message, base_url) for message in messages]})
     except ChatSession.DoesNotExist:
         return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -736,7 +752,7 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
 
 class AgentViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for agent management"""
-    queryset = Agent.objects.all()
+    queryset = Agent.objects.select_related('user__user_profile')
     serializer_class = AgentSerializer
     permission_classes = [AllowAny] if settings.DEBUG else [IsAuthenticated]
     
@@ -750,30 +766,35 @@ class AgentViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'status': f'Availability set to {is_available}'})
 
 
+def _cached_knowledge_data(name, loader):
+    """Response data built from KnowledgeBase, cached until the knowledge base next changes"""
+    return cache.get_or_set(f'api:{name}:{knowledge_version()}', loader, PUBLIC_API_CACHE_TTL)
+
+
+def _knowledge_entries_data(category):
+    entries = KnowledgeBase.objects.filter(category=category, is_active=True).order_by('-priority', 'title')
+    return list(KnowledgeBaseSerializer(entries, many=True).data)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def faqs_api(request):
     """Get all FAQ entries"""
-    faqs = KnowledgeBase.objects.filter(category='faq', is_active=True).order_by('-priority', 'title')
-    serializer = KnowledgeBaseSerializer(faqs, many=True)
-    return Response(serializer.data)
+    return Response(_cached_knowledge_data('faqs', lambda: _knowledge_entries_data('faq')))
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def services_api(request):
     """Get all service entries"""
-    services = KnowledgeBase.objects.filter(category='service', is_active=True).order_by('-priority', 'title')
-    serializer = KnowledgeBaseSerializer(services, many=True)
-    return Response(serializer.data)
+    return Response(_cached_knowledge_data('services', lambda: _knowledge_entries_data('service')))
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def pricing_api(request):
     """Get pricing information with interactive packages"""
-    from .ai_engine import AIEngine
-    ai_engine = AIEngine()
+    ai_engine = get_engine()
     return Response({
         'pricing': ai_engine.pricing_info['content'],
         'packages': ai_engine.pricing_info.get('packages', [
@@ -809,8 +830,7 @@ def pricing_api(request):
 @permission_classes([AllowAny])
 def services_detail_api(request):
     """Get detailed services information from AI engine"""
-    from .ai_engine import AIEngine
-    ai_engine = AIEngine()
+    ai_engine = get_engine()
     services_list = []
     for service_key, service_data in ai_engine.novyra_services.items():
         services_list.append({
@@ -865,8 +885,7 @@ def agent_availability_api(request):
 @permission_classes([AllowAny])
 def common_questions_api(request):
     """Get common questions for option buttons"""
-    questions = get_common_questions()
-    return Response(questions)
+    return Response(_cached_knowledge_data('common_questions', get_common_questions))
 
 
 @api_view(['POST'])
@@ -923,6 +942,14 @@ def create_ticket_api(request):
 @permission_classes([AllowAny])
 def widget_config_api(request):
     """Get widget configuration including bot name and profile image"""
+    # Cached until a ChatWidgetConfig is saved/deleted (see signals); the image URL is made absolute per request
+    data = cache.get_or_set(WIDGET_CONFIG_CACHE_KEY, _active_widget_config_data, PUBLIC_API_CACHE_TTL)
+    if data['bot_profile_image']:
+        data = {**data, 'bot_profile_image': request.build_absolute_uri(data['bot_profile_image'])}
+    return Response(data)
+
+
+def _active_widget_config_data():
     config = ChatWidgetConfig.objects.filter(is_active=True).first()
     if not config:
         # Create default config
@@ -935,18 +962,14 @@ def widget_config_api(request):
             widget_height=600
         )
     
-    bot_profile_image_url = None
-    if config.bot_profile_image:
-        bot_profile_image_url = request.build_absolute_uri(config.bot_profile_image.url)
-    
-    return Response({
+    return {
         'bot_name': config.bot_name,
-        'bot_profile_image': bot_profile_image_url,
+        'bot_profile_image': config.bot_profile_image.url if config.bot_profile_image else None,
         'button_color': config.button_color,
         'button_position': config.button_position,
         'widget_width': config.widget_width,
         'widget_height': config.widget_height,
-    })
+    }
 
 
 @api_view(['POST'])
@@ -992,7 +1015,22 @@ def agent_chats_api(request):
     """List or create agent-to-agent chats"""
     if request.method == 'GET':
         # Get all chats where current user is a participant
-        chats = AgentChat.objects.filter(participants=request.user, is_active=True)
+        # Participants, latest message and unread count load with the chats instead of per chat;
+        # Meta.ordering is ignored once the Count adds a GROUP BY, so order explicitly
+        chats = AgentChat.objects.filter(participants=request.user, is_active=True).annotate(
+            unread_message_count=Count(
+                'messages',
+                filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user),
+                distinct=True,
+            ),
+        ).order_by('-updated_at').prefetch_related(
+            'participants',
+            Prefetch(
+                'messages',
+                queryset=AgentMessage.objects.select_related('sender').order_by('-created_at')[:1],
+                to_attr='latest_messages',
+            ),
+        )
         serializer = AgentChatSerializer(chats, many=True, context={'request': request})
         return Response({'results': serializer.data})
     
@@ -1029,7 +1067,7 @@ def agent_chat_messages_api(request, chat_id):
         return Response({'error': 'Chat not found'}, status=status.HTTP_404_NOT_FOUND)
     
     if request.method == 'GET':
-        messages = chat.messages.all()
+        messages = chat.messages.select_related('sender')
         serializer = AgentMessageSerializer(messages, many=True, context={'request': request})
         return Response({'messages': serializer.data})
     